@@ -2,6 +2,7 @@ import sys
 from pathlib import Path
 from typing import Annotated
 
+import typer
 from attrs import define
 from dotmap import DotMap
 from typer import Argument, Option
@@ -12,6 +13,7 @@ from broken.manager import ProjectManager
 from broken.path import BrokenPath
 from broken.project import BROKEN
 from broken.system import PlatformEnum
+from broken.typerx import BrokenTyper
 from broken.utils import combinations, shell
 
 
@@ -32,6 +34,9 @@ class BrokenManager(ProjectManager):
             self.cli.command(self.sync)
             self.cli.command(self.link)
 
+        with self.cli.panel("🎬 Media"):
+            self.cli.command(self.ffmpeg, context=True, help=False)
+
         self.cli.description = (
             "🚀 Broken Source Software Monorepo development manager script\n\n"
             "• Tip: run \"broken (command) --help\" for options on commands or projects ✨\n\n"
@@ -165,6 +170,19 @@ class BrokenManager(ProjectManager):
         """🔗 Link a project to the meta directory"""
         BrokenPath.symlink(virtual=BROKEN.DIRECTORIES.REPO_META, real=path)
 
+    def ffmpeg(self, ctx: typer.Context) -> None:
+        """🎬 FFmpeg tools, like benchmarking all codecs on this machine"""
+        from broken.externals.ffmpeg import BrokenFFmpeg
+
+        def capabilities() -> None:
+            """🔎 Show the version, encoders, decoders, filters and pixel formats of FFmpeg"""
+            print(BrokenFFmpeg.capabilities().model_dump_json(indent=2))
+
+        cli = BrokenTyper(description="🎬 FFmpeg tools")
+        cli.command(BrokenFFmpeg.bench)
+        cli.command(capabilities)
+        cli(*ctx.args)
+
     def workflow_pyaket(self) -> None:
         for project in self.projects:
             for platform in PlatformEnum.all_host():
@@ -1,30 +1,50 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import errno
 import functools
 import io
+import itertools
+import json
+import math
+import os
 import re
+import shutil
+import struct
 import subprocess
+import tempfile
+import time
 from abc import ABC, abstractmethod
 from collections import deque
-from collections.abc import Iterable
+from collections.abc import AsyncGenerator, Callable, Iterable
 from pathlib import Path
+from queue import Empty, Queue
 from subprocess import DEVNULL, PIPE, Popen
-from typing import Annotated, Generator, Literal, Optional, Self, TypeAlias, Union
+from threading import Lock, Semaphore, Thread
+from typing import TYPE_CHECKING, Annotated, Any, ClassVar, Generator, Literal, Optional, Self, TypeAlias, Union
 
 import numpy as np
 import typer
-from attrs import define
+from attrs import Factory, define, field
 from halo import Halo
-from pydantic import ConfigDict, Field, field_validator
+from pydantic import ConfigDict, Field, PrivateAttr, field_validator
 from typer import Option
 
+import broken.project
 from broken import logger
 from broken.enumx import BrokenEnum
 from broken.model import BrokenModel
 from broken.path import BrokenPath
+from broken.resolution import BrokenResolution
 from broken.system import Host
 from broken.typerx import BrokenTyper
-from broken.utils import denum, every, flatten, nearest, shell
+from broken.utils import denum, every, flatten, list_get, nearest, shell
+from broken.vectron import Vectron
+from broken.worker import BrokenWorker
+
+if TYPE_CHECKING:
+    from diskcache import Cache as DiskCache
 
 # ---------------------------------------------------------------------------- #
 
@@ -47,8 +67,21 @@ class FFmpegInputPath(FFmpegModuleBase):
     type: Annotated[Literal["path"], BrokenTyper.exclude()] = "path"
     path: Path
 
+    seek: Annotated[Optional[float],
+        Option("--seek", "-ss", min=0)] = \
+        Field(None, ge=0)
+    """Start reading at this time in seconds. Demuxing jumps to the nearest keyframe before it,
+    and only the frames in between are decoded and discarded for an accurate start"""
+
+    duration: Annotated[Optional[float],
+        Option("--duration", "-t", min=0)] = \
+        Field(None, gt=0)
+    """Stop reading after this many seconds of the input"""
+
     def command(self, ffmpeg: BrokenFFmpeg) -> Iterable[str]:
-        return ("-i", self.path)
+        yield every("-ss", self.seek)
+        yield every("-t", self.duration)
+        yield ("-i", self.path)
 
 
 class FFmpegInputPipe(FFmpegModuleBase):
@@ -73,25 +106,78 @@ class FFmpegInputPipe(FFmpegModuleBase):
         Option("--pixel-format", "-p")] = \
         Field(PixelFormat.RGB24)
 
+    class Convert(str, BrokenEnum):
+        YUV420P = "yuv420p"
+        NV12    = "nv12"
+
+    convert: Annotated[Optional[Convert],
+        Option("--convert", "-c")] = \
+        Field(None)
+    """Convert rgb frames to yuv on our side, sending 1.5 bytes per pixel instead of 3"""
+
+    matrix: Annotated[Vectron.Matrix,
+        Option("--matrix", "-m")] = \
+        Field(Vectron.Matrix.BT709)
+    """Color matrix of the converted frames"""
+
+    threads: Annotated[Optional[int],
+        Option("--threads", "-t", min=1)] = \
+        Field(None, ge=1)
+    """Threads converting each frame in row bands, see `Vectron.rgb_to_yuv`. Automatic if None"""
+
     width: int = Field(1920, gt=0)
     height: int = Field(1080, gt=0)
     framerate: float = Field(60.0, ge=1.0)
 
+    source: Annotated[str, BrokenTyper.exclude()] = Field("-")
+    """Where FFmpeg reads the frames from, stdin or a named fifo path or unix socket url"""
+
     @field_validator("framerate", mode="plain")
     def validate_framerate(cls, value: Union[float, str]) -> float:
         return eval(str(value))
 
+    def prepare(self, frame: Union[bytes, np.ndarray]) -> Union[bytes, np.ndarray]:
+        """The data to send over the pipe for a frame, converted if needed"""
+        if (self.convert is None) or (not isinstance(frame, np.ndarray)):
+            return frame
+        threads = (self.threads or min(8, os.cpu_count() or 1))
+        return Vectron.rgb_to_yuv(frame, format=denum(self.convert), matrix=self.matrix, threads=threads)
+
     def command(self, ffmpeg: BrokenFFmpeg) -> Iterable[str]:
         yield ("-f", denum(self.format))
         yield ("-s", f"{self.width}x{self.height}")
-        yield ("-pix_fmt", denum(self.pixel_format))
+        if (self.convert is not None):
+            yield ("-pix_fmt", denum(self.convert))
+            yield ("-color_range", "tv")
+            yield ("-colorspace", dict(bt709="bt709", bt601="smpte170m")[denum(self.matrix)])
+        else:
+            yield ("-pix_fmt", denum(self.pixel_format))
         yield ("-r", self.framerate)
-        yield ("-i", "-")
+        yield ("-i", self.source)
+
+
+class FFmpegInputConcat(FFmpegModuleBase):
+    """Join many files of the same codecs with the concat demuxer, from a list file"""
+    type: Annotated[Literal["concat"], BrokenTyper.exclude()] = "concat"
+    path: Path
+
+    @staticmethod
+    def listing(files: Iterable[Path]) -> str:
+        """Build the list file content for some files, escaping quotes"""
+        return "".join(
+            "file '{}'\n".format(str(Path(file).absolute()).replace("'", "'\\''"))
+            for file in files
+        )
+
+    def command(self, ffmpeg: BrokenFFmpeg) -> Iterable[str]:
+        yield ("-f", "concat", "-safe", "0")
+        yield ("-i", self.path)
 
 
 FFmpegInputType: TypeAlias = Union[
     FFmpegInputPath,
     FFmpegInputPipe,
+    FFmpegInputConcat,
 ]
 
 # ---------------------------------------------------------------------------- #
@@ -115,10 +201,19 @@ class FFmpegOutputPath(FFmpegModuleBase):
         Option("--pixel-format", "-p")] = \
         Field(PixelFormat.YUV420P)
 
+    maps: Annotated[list[str], BrokenTyper.exclude()] = Field(default_factory=list)
+    """Filter graph pads or stream specifiers of this output, all graph outputs if empty"""
+
     def command(self, ffmpeg: BrokenFFmpeg) -> Iterable[str]:
         yield every("-pix_fmt", denum(self.pixel_format))
         yield (self.path, self.overwrite*"-y")
 
+    def tee(self, options: dict[str, str]) -> str:
+        """This output as a tee muxer slave, with muxer options"""
+        if (Path(self.path).suffix.lower() not in (".mp4", ".mov", ".m4v")):
+            options = {k: v for (k, v) in options.items() if (k != "movflags")}
+        return FFmpegOutputPipe.slave(str(self.path), options)
+
 
 class FFmpegOutputPipe(FFmpegModuleBase):
     type: Annotated[Literal["pipe"], BrokenTyper.exclude()] = "pipe"
@@ -135,22 +230,135 @@ class FFmpegOutputPipe(FFmpegModuleBase):
         Field("mpegts")
 
     class PixelFormat(str, BrokenEnum):
-        RGB24 = "rgb24"
-        RGBA  = "rgba"
+        RGB24   = "rgb24"
+        BGR24   = "bgr24"
+        RGBA    = "rgba"
+        BGRA    = "bgra"
+        Gray    = "gray"
+        YUV420P = "yuv420p"
+        YUV444P = "yuv444p"
+        NV12    = "nv12"
 
     pixel_format: Annotated[Optional[PixelFormat],
         Option("--pixel-format", "-p")] = \
         Field(None)
 
+    maps: Annotated[list[str], BrokenTyper.exclude()] = Field(default_factory=list)
+    """Filter graph pads or stream specifiers of this output, all graph outputs if empty"""
+
     def command(self, ffmpeg: BrokenFFmpeg) -> Iterable[str]:
         yield every("-f", denum(self.format))
         yield every("-pix_fmt", denum(self.pixel_format))
         yield "pipe:1"
 
+    def tee(self, options: dict[str, str]) -> str:
+        """This output as a tee muxer slave, with muxer options"""
+        options = {k: v for (k, v) in options.items() if (k != "movflags")}
+        return FFmpegOutputPipe.slave("pipe:1", dict(f=denum(self.format), **options) if self.format else options)
+
+    @staticmethod
+    def slave(target: str, options: dict[str, str]) -> str:
+        for char in ("\\", "|", "[", "]"):
+            target = target.replace(char, f"\\{char}")
+        if (options := ":".join(f"{k}={v}" for (k, v) in options.items())):
+            return f"[{options}]{target}"
+        return target
+
+
+class FFmpegOutputRendition(FFmpegOutputPath):
+    """A file output scaled from the same source as the others, a step of a rendition ladder"""
+    type: Annotated[Literal["rendition"], BrokenTyper.exclude()] = "rendition"
+
+    width: Optional[int] = Field(None, gt=0)
+    """Target width, found from the source's aspect ratio if missing"""
+
+    height: Optional[int] = Field(None, gt=0)
+    """Target height, found from the source's aspect ratio if missing"""
+
+    bitrate: Optional[int] = Field(None, gt=0)
+    """Cap the video bitrate in kilobits per second, with a two seconds buffer"""
+
+    video_codec: Optional[FFmpegVideoCodecType] = Field(None)
+    """Use a different video codec than the main one for this output"""
+
+    def resolution(self, source: tuple[int, int]) -> tuple[int, int]:
+        """The final resolution of this rendition from the source's"""
+        if all((self.width, self.height)):
+            return (self.width, self.height)
+        return BrokenResolution.fit(
+            old=source, new=(self.width, self.height),
+            ar=(source[0]/source[1]),
+        )
+
+    def command(self, ffmpeg: BrokenFFmpeg) -> Iterable[str]:
+        if (self.bitrate is not None):
+            yield ("-maxrate", f"{self.bitrate}k")
+            yield ("-bufsize", f"{2*self.bitrate}k")
+        yield from super().command(ffmpeg)
+
+
+class FFmpegOutputHLS(FFmpegModuleBase):
+    """
+    Write HLS segments and a playlist as the encode progresses, so the first seconds can be
+    watched before the render finishes, see `BrokenServer.stream`
+
+    [**FFmpeg docs**](https://ffmpeg.org/ffmpeg-formats.html#hls-2)
+    """
+    type: Annotated[Literal["hls"], BrokenTyper.exclude()] = "hls"
+
+    overwrite: Annotated[bool,
+        Option("--overwrite", "-y", " /--no-overwrite", " /-n")] = \
+        Field(True)
+
+    path: Annotated[Path,
+        typer.Argument(help="The output playlist path, segments are written next to it")] = \
+        Field(...)
+
+    segment: Annotated[float,
+        Option("--segment", "-s", min=0.1)] = \
+        Field(2.0, gt=0)
+    """Duration of each segment in seconds, keyframes are forced on their boundaries"""
+
+    cmaf: Annotated[bool,
+        Option("--cmaf", " /--mpegts")] = \
+        Field(True)
+    """Use fragmented mp4 (CMAF) segments instead of mpegts ones"""
+
+    pixel_format: Annotated[Optional[FFmpegOutputPath.PixelFormat],
+        Option("--pixel-format", "-p")] = \
+        Field(FFmpegOutputPath.PixelFormat.YUV420P)
+
+    maps: Annotated[list[str], BrokenTyper.exclude()] = Field(default_factory=list)
+    """Filter graph pads or stream specifiers of this output, all graph outputs if empty"""
+
+    def setup(self) -> None:
+        """Create the segments directory, called before FFmpeg starts"""
+        BrokenPath.mkdir(Path(self.path).parent)
+
+    def command(self, ffmpeg: BrokenFFmpeg) -> Iterable[str]:
+        path = Path(self.path)
+        yield every("-pix_fmt", denum(self.pixel_format))
+        yield ("-force_key_frames", f"expr:gte(t,n_forced*{self.segment})")
+        yield ("-f", "hls")
+        yield ("-hls_time", self.segment)
+        yield ("-hls_list_size", 0)
+        yield ("-hls_playlist_type", "event")
+
+        # Note: Segments are written to a temporary file and renamed when complete
+        yield ("-hls_flags", "independent_segments+temp_file")
+
+        if self.cmaf:
+            yield ("-hls_segment_type", "fmp4")
+            yield ("-hls_fmp4_init_filename", f"{path.stem}-init.mp4")
+        yield ("-hls_segment_filename", path.parent/f"{path.stem}-%05d.{'m4s' if self.cmaf else 'ts'}")
+        yield (path, self.overwrite*"-y")
+
 
 FFmpegOutputType = Union[
     FFmpegOutputPipe,
     FFmpegOutputPath,
+    FFmpegOutputRendition,
+    FFmpegOutputHLS,
 ]
 
 # ---------------------------------------------------------------------------- #
@@ -805,7 +1013,8 @@ class FFmpegPCM(BrokenEnum):
     @property
     @functools.lru_cache
     def dtype(self) -> np.dtype:
-        return np.dtype(f"{self.endian}{self.value[4]}{self.size}")
+        kind = dict(s="i", u="u", f="f")[self.value[4]]
+        return np.dtype(f"{self.endian}{kind}{self.size}")
 
 
 class FFmpegAudioCodecPCM(FFmpegModuleBase):
@@ -816,8 +1025,20 @@ class FFmpegAudioCodecPCM(FFmpegModuleBase):
         Option("--format", "-f")] = \
         Field(FFmpegPCM.PCM_FLOAT_32_BITS_LITTLE_ENDIAN)
 
+    samplerate: Annotated[Optional[int],
+        Option("--samplerate", "-r", min=1)] = \
+        Field(None, ge=1)
+    """Resample to this rate in FFmpeg, keeps the source's when None"""
+
+    channels: Annotated[Optional[int],
+        Option("--channels", "-c", min=1)] = \
+        Field(None, ge=1)
+    """Down or upmix to this many channels in FFmpeg, keeps the source's when None"""
+
     def command(self, ffmpeg: BrokenFFmpeg) -> Iterable[str]:
         yield ("-c:a", self.format.value, "-f", self.format.value.removeprefix("pcm_"))
+        yield every("-ar", self.samplerate)
+        yield every("-ac", self.channels)
 
 
 FFmpegAudioCodecType: TypeAlias = Union[
@@ -842,6 +1063,18 @@ class FFmpegFilterBase(BrokenModel, ABC):
     def string(self) -> Iterable[str]:
         ...
 
+    def media(self) -> Optional[Literal["video", "audio"]]:
+        """The stream type the filter works on, None when unknown"""
+        return "video"
+
+    def inputs(self) -> int:
+        """Number of input pads, plain `-vf` chains can only feed one"""
+        return 1
+
+    def labelled(self) -> bool:
+        """Whether the filter names its own pads, only valid in a `-filter_complex`"""
+        return False
+
 
 class FFmpegFilterScale(FFmpegFilterBase):
     type: Annotated[Literal["scale"], BrokenTyper.exclude()] = "scale"
@@ -878,18 +1111,441 @@ class FFmpegFilterCustom(FFmpegFilterBase):
 
     content: str
 
+    LABELS: ClassVar[re.Pattern] = re.compile(r"^((?:\[[^\]]*\])*)(.*?)((?:\[[^\]]*\])*)$", re.DOTALL)
+
     def string(self) -> str:
         return self.content
 
+    def media(self) -> None:
+        return None
+
+    def labelled(self) -> bool:
+        return bool(re.search(r"\[[^\]]*\]", self.content))
+
+    def pads(self) -> tuple[list[str], str, list[str]]:
+        """Split into the leading input labels, the filters, and the trailing output labels"""
+        (inputs, body, outputs) = self.LABELS.match(self.content.strip()).groups()
+        return (re.findall(r"\[([^\]]*)\]", inputs), body, re.findall(r"\[([^\]]*)\]", outputs))
+
+
+class FFmpegFilterPad(FFmpegFilterBase):
+    """Pad the frame to a larger size, placing the original at (x, y)"""
+    type: Annotated[Literal["pad"], BrokenTyper.exclude()] = "pad"
+
+    width: int = Field(gt=0)
+    height: int = Field(gt=0)
+    x: Union[int, str] = Field("(ow-iw)/2")
+    y: Union[int, str] = Field("(oh-ih)/2")
+    color: str = Field("black")
+
+    def string(self) -> str:
+        return f"pad={self.width}:{self.height}:{self.x}:{self.y}:{self.color}"
+
+
+class FFmpegFilterOverlay(FFmpegFilterBase):
+    """Draw the second input over the first at (x, y), e.g. watermarks"""
+    type: Annotated[Literal["overlay"], BrokenTyper.exclude()] = "overlay"
+
+    x: Union[int, str] = Field(0)
+    y: Union[int, str] = Field(0)
+
+    def string(self) -> str:
+        return f"overlay={self.x}:{self.y}"
+
+    def inputs(self) -> int:
+        return 2
+
+
+class FFmpegFilterSplit(FFmpegFilterBase):
+    """Duplicate a stream into many outputs, `asplit` for audio"""
+    type: Annotated[Literal["split"], BrokenTyper.exclude()] = "split"
+
+    outputs: int = Field(2, ge=1)
+    audio: bool = Field(False)
+
+    def string(self) -> str:
+        return f"{'a'*self.audio}split={self.outputs}"
+
+    def media(self) -> Literal["video", "audio"]:
+        return ("audio" if self.audio else "video")
+
+
+class FFmpegFilterVolume(FFmpegFilterBase):
+    """Multiply the audio volume"""
+    type: Annotated[Literal["volume"], BrokenTyper.exclude()] = "volume"
+
+    volume: float = Field(1.0, ge=0)
+
+    def string(self) -> str:
+        return f"volume={self.volume}"
+
+    def media(self) -> Literal["audio"]:
+        return "audio"
+
 
 FFmpegFilterType: TypeAlias = Union[
     FFmpegFilterScale,
     FFmpegFilterVerticalFlip,
-    FFmpegFilterCustom
+    FFmpegFilterPad,
+    FFmpegFilterOverlay,
+    FFmpegFilterSplit,
+    FFmpegFilterVolume,
+    FFmpegFilterCustom,
 ]
 
 # ---------------------------------------------------------------------------- #
 
+class FFmpegFilterChain(BrokenModel):
+    """A linear chain of filters of a graph, from input pads to output pads"""
+
+    inputs: list[str] = Field(default_factory=list)
+    """Named pads of other chains, or input stream specifiers like `0:v` or `1:a:0`"""
+
+    filters: list[FFmpegFilterType] = Field(default_factory=list)
+
+    outputs: list[str] = Field(default_factory=list)
+    """Named pads this chain produces"""
+
+    media: Literal["video", "audio"] = Field("video")
+    """The type of the produced streams"""
+
+    def string(self) -> str:
+        return "".join((
+            "".join(f"[{pad}]" for pad in self.inputs),
+            ",".join(map(str, self.filters)),
+            "".join(f"[{pad}]" for pad in self.outputs),
+        ))
+
+
+class FFmpegFilterGraph(BrokenModel):
+    """
+    A typed `-filter_complex` of many chains linked by named pads, for compositing many
+    inputs, audio filters and different chains per output
+
+    ```python
+    graph = (FFmpegFilterGraph()
+        .chain(FFmpegFilterScale(width=1280, height=720), inputs=["0:v"], outputs=["base"])
+        .chain(FFmpegFilterOverlay(x=16, y=16), inputs=["base", "1:v"], outputs=["video"])
+        .chain(FFmpegFilterVolume(volume=0.5), inputs=["2:a"], outputs=["audio"], media="audio")
+    )
+    ```
+    """
+    chains: list[FFmpegFilterChain] = Field(default_factory=list)
+
+    SPECIFIER: ClassVar[re.Pattern] = re.compile(r"^(\d+)(:[vas])?(:\d+)?$")
+    KINDS: ClassVar[dict[str, str]] = {":v": "video", ":a": "audio"}
+
+    def chain(self,
+        *filters: Union[FFmpegFilterType, str],
+        inputs: Iterable[str]=(),
+        outputs: Iterable[str]=(),
+        media: Literal["video", "audio"]="video",
+    ) -> Self:
+        """Add a chain of filters, plain strings are custom filters"""
+        self.chains.append(FFmpegFilterChain(
+            inputs=list(inputs), outputs=list(outputs), media=media,
+            filters=[(FFmpegFilterCustom(content=item) if isinstance(item, str) else item) for item in filters],
+        ))
+        return self
+
+    @staticmethod
+    def label(pad: str) -> str:
+        """A pad as a `-map` argument, brackets named ones"""
+        return (pad if FFmpegFilterGraph.SPECIFIER.match(pad) else f"[{pad}]")
+
+    def media(self) -> dict[str, str]:
+        """Media type of every named pad"""
+        return {pad: chain.media for chain in self.chains for pad in chain.outputs}
+
+    def sinks(self) -> list[str]:
+        """Named pads no chain consumes, which must be mapped to outputs"""
+        consumed = {pad for chain in self.chains for pad in chain.inputs}
+        return [pad for chain in self.chains for pad in chain.outputs if (pad not in consumed)]
+
+    def check(self, inputs: int) -> Self:
+        """Validate the graph's links against a number of inputs, raises ValueError"""
+        produced, consumed = dict(), set()
+
+        for (index, chain) in enumerate(self.chains):
+            if (not chain.filters):
+                raise ValueError(f"Filter chain ({index}) has no filters")
+            for pad in chain.outputs:
+                if self.SPECIFIER.match(pad) or not pad.isidentifier():
+                    raise ValueError(f"Output pad ({pad}) of chain ({index}) must be a plain name")
+                if pad in produced:
+                    raise ValueError(f"Pad ({pad}) is produced by both chains ({produced[pad]}) and ({index})")
+                produced[pad] = index
+
+        for (index, chain) in enumerate(self.chains):
+            for item in chain.filters:
+                if (kind := item.media()) and (kind != chain.media):
+                    raise ValueError(f"Chain ({index}) produces {chain.media} but has a filter ({item}) for {kind}")
+
+            # Note: Custom filters may convert between types, only known ones are checked
+            expects = chain.filters[0].media()
+
+            for pad in chain.inputs:
+                if (match := self.SPECIFIER.match(pad)):
+                    if (int(match.group(1)) >= inputs):
+                        raise ValueError(f"Chain ({index}) reads input ({pad}) but there are only ({inputs}) inputs")
+                    if expects and (kind := self.KINDS.get(match.group(2))) and (kind != expects):
+                        raise ValueError(f"Chain ({index}) reads {kind} input ({pad}) into a filter for {expects}")
+                    continue
+                if (pad not in produced):
+                    raise ValueError(f"Chain ({index}) reads pad ({pad}) that no chain produces")
+                if (pad in consumed):
+                    raise ValueError(f"Pad ({pad}) is consumed more than once, split it first")
+                if expects and ((kind := self.chains[produced[pad]].media) != expects):
+                    raise ValueError(f"Chain ({index}) reads {kind} pad ({pad}) into a filter for {expects}")
+                consumed.add(pad)
+
+        # Kahn's algorithm, chains must form a directed acyclic graph
+        pending = {index: {produced[pad] for pad in chain.inputs if pad in produced}
+            for (index, chain) in enumerate(self.chains)}
+        while (ready := [index for (index, needs) in pending.items() if not needs]):
+            for index in ready:
+                pending.pop(index)
+            for needs in pending.values():
+                needs.difference_update(ready)
+        if pending:
+            raise ValueError(f"Filter chains ({sorted(pending)}) form a cycle")
+
+        return self
+
+    def string(self) -> str:
+        return ";".join(chain.string() for chain in self.chains)
+
+# ---------------------------------------------------------------------------- #
+
+class FFmpegProbeBase(BrokenModel):
+    model_config = ConfigDict(
+        use_attribute_docstrings=True,
+        extra="allow",
+    )
+
+    @field_validator("*", mode="before")
+    def validate_unavailable(cls, value: Any) -> Any:
+        return (None if (value == "N/A") else value)
+
+    @staticmethod
+    def fraction(value: Optional[str]) -> Optional[float]:
+        """Evaluate ffprobe's 'num/den' rationals, None on unknown or zero denominators"""
+        if not value:
+            return None
+        (num, _, den) = str(value).partition("/")
+        if float(den or 1) == 0:
+            return None
+        return float(num)/float(den or 1)
+
+
+class FFmpegProbeStream(FFmpegProbeBase):
+    """A single stream of `ffprobe -show_streams`, unlisted fields are kept as extras"""
+    index: int = 0
+    codec_name: Optional[str] = None
+    codec_type: Optional[str] = None
+    duration: Optional[float] = None
+    bit_rate: Optional[int] = None
+    time_base: Optional[str] = None
+    start_time: Optional[float] = None
+
+    # Video
+    width: Optional[int] = None
+    height: Optional[int] = None
+    pix_fmt: Optional[str] = None
+    r_frame_rate: Optional[str] = None
+    avg_frame_rate: Optional[str] = None
+    nb_frames: Optional[int] = None
+    nb_read_packets: Optional[int] = None
+    nb_read_frames: Optional[int] = None
+
+    # Audio
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    channel_layout: Optional[str] = None
+
+    @property
+    def framerate(self) -> Optional[float]:
+        return self.fraction(self.r_frame_rate)
+
+    @property
+    def resolution(self) -> Optional[tuple[int, int]]:
+        return every(self.width, self.height, cast=tuple)
+
+
+class FFmpegProbeFormat(FFmpegProbeBase):
+    """The container of `ffprobe -show_format`, unlisted fields are kept as extras"""
+    filename: Optional[str] = None
+    nb_streams: int = 0
+    format_name: Optional[str] = None
+    start_time: Optional[float] = None
+    duration: Optional[float] = None
+    size: Optional[int] = None
+    bit_rate: Optional[int] = None
+    tags: dict[str, str] = Field(default_factory=dict)
+
+
+class FFmpegProbe(FFmpegProbeBase):
+    """Everything ffprobe knows about a file from a single call"""
+    streams: list[FFmpegProbeStream] = Field(default_factory=list)
+    format: FFmpegProbeFormat = Field(default_factory=FFmpegProbeFormat)
+
+    def of_type(self, type: Literal["video", "audio", "subtitle", "data"]) -> list[FFmpegProbeStream]:
+        return [stream for stream in self.streams if (stream.codec_type == type)]
+
+    def video(self, n: int=0) -> Optional[FFmpegProbeStream]:
+        """Get the nth video stream, if any"""
+        return list_get(self.of_type("video"), n)
+
+    def audio(self, n: int=0) -> Optional[FFmpegProbeStream]:
+        """Get the nth audio stream, if any"""
+        return list_get(self.of_type("audio"), n)
+
+
+class FFmpegFrameCount(BrokenModel):
+    """A video's total frames and how it was counted"""
+
+    class Tier(str, BrokenEnum):
+        Container = "container"
+        Packets   = "packets"
+        Decode    = "decode"
+
+    frames: int = Field(0, ge=0)
+    """The total number of frames"""
+
+    tier: Tier = Field(Tier.Container)
+    """The method that produced the count, from cheapest to most exact"""
+
+
+class FFmpegValidation(str, BrokenEnum):
+    """How thoroughly to check a video file, from cheapest to most exact"""
+
+    Header = "header"
+    """ffprobe parses the container and finds a video stream"""
+
+    Sample = "sample"
+    """Decode a few keyframes spread across the duration"""
+
+    Full = "full"
+    """Decode every frame of the file"""
+
+
+@define
+class FFmpegThumbnails:
+    """Evenly spaced keyframes of a video and their contact sheet, see `BrokenFFmpeg.thumbnails`"""
+
+    times: list[float] = Factory(list)
+    """Timestamps of each frame, relative to the start of the video"""
+
+    frames: list[Union[np.ndarray, bytes]] = Factory(list)
+    """Each frame as a (height, width, 3) rgb24 array, or an encoded image"""
+
+    sheet: Optional[Union[np.ndarray, bytes]] = None
+    """All frames tiled row-major into a single image, when requested"""
+
+    @property
+    def poster(self) -> Optional[Union[np.ndarray, bytes]]:
+        """The first frame, a good preview of the video"""
+        return list_get(self.frames, 0)
+
+
+class FFmpegProgress(BrokenModel):
+    """A progress report of a running FFmpeg, from its `-progress` key=value blocks"""
+
+    PERIOD: ClassVar[float] = 0.5
+    """Seconds between reports, `-stats_period`"""
+
+    frame: int = 0
+    """Number of frames encoded so far"""
+
+    fps: float = 0.0
+    """Current encoding frames per second"""
+
+    bitrate: Optional[float] = None
+    """Current output bitrate in kilobits per second"""
+
+    size: int = 0
+    """Bytes written to the outputs so far"""
+
+    time: float = 0.0
+    """Output timestamp in seconds"""
+
+    speed: Optional[float] = None
+    """Encoding speed relative to realtime"""
+
+    dup: int = 0
+    """Frames duplicated to keep a constant framerate"""
+
+    drop: int = 0
+    """Frames dropped to keep a constant framerate"""
+
+    elapsed: float = 0.0
+    """Seconds since the first report was read"""
+
+    end: bool = False
+    """Whether this is the last report"""
+
+    @staticmethod
+    def parse(stream: Iterable[Union[str, bytes]]) -> Generator[FFmpegProgress, None, None]:
+        """Yield a report for every block of lines, unknown keys and N/A values are ignored"""
+        fields, start = dict(), time.perf_counter()
+
+        def number(value: str, cast: type=float) -> Optional[Union[int, float]]:
+            with contextlib.suppress(ValueError):
+                return cast(value.rstrip("kbits/sx").strip())
+            return None
+
+        for line in stream:
+            line = (line.decode(errors="replace") if isinstance(line, bytes) else line)
+            (key, _, value) = line.strip().partition("=")
+            value = value.strip()
+
+            if (key == "frame"):
+                fields["frame"] = number(value, int)
+            elif (key == "fps"):
+                fields["fps"] = number(value)
+            elif (key == "bitrate"):
+                fields["bitrate"] = number(value)
+            elif (key == "total_size"):
+                fields["size"] = number(value, int)
+            elif (key == "out_time_us"):
+                fields["time"] = (number(value, int) or 0)/1e6
+            elif (key == "speed"):
+                fields["speed"] = number(value)
+            elif (key == "dup_frames"):
+                fields["dup"] = number(value, int)
+            elif (key == "drop_frames"):
+                fields["drop"] = number(value, int)
+            elif (key == "progress"):
+                yield FFmpegProgress(
+                    **{k: v for (k, v) in fields.items() if (v is not None)},
+                    elapsed=(time.perf_counter() - start),
+                    end=(value == "end"),
+                )
+
+
+class FFmpegCapabilities(BrokenModel):
+    """What a FFmpeg binary was compiled with, see `BrokenFFmpeg.capabilities`"""
+
+    binary: str = ""
+    """Path of the FFmpeg binary"""
+
+    version: str = ""
+    """Version string of the binary, `ffmpeg -version`"""
+
+    encoders: set[str] = Field(default_factory=set)
+    decoders: set[str] = Field(default_factory=set)
+    filters: set[str] = Field(default_factory=set)
+    pixel_formats: set[str] = Field(default_factory=set)
+
+    @staticmethod
+    def names(output: str, *, start: str) -> set[str]:
+        """Second column of every line after the `start` marker of a `ffmpeg -hide_banner -<list>`"""
+        lines = output.splitlines()
+        index = next((i for (i, line) in enumerate(lines) if line.strip().startswith(start)), len(lines))
+        return {parts[1] for line in lines[index + 1:] if len(parts := line.split()) >= 2}
+
+# ---------------------------------------------------------------------------- #
+
 class BrokenFFmpeg(BrokenModel):
     """💎 Your premium FFmpeg class, serializable, sane defaults, safety"""
 
@@ -897,8 +1553,9 @@ class BrokenFFmpeg(BrokenModel):
     # Re-export classes on BrokenFFmpeg.*
 
     class Input:
-        Path = FFmpegInputPath
-        Pipe = FFmpegInputPipe
+        Path   = FFmpegInputPath
+        Pipe   = FFmpegInputPipe
+        Concat = FFmpegInputConcat
 
     class Output:
         Path = FFmpegOutputPath
@@ -929,7 +1586,12 @@ class BrokenFFmpeg(BrokenModel):
     class Filter:
         Scale        = FFmpegFilterScale
         VerticalFlip = FFmpegFilterVerticalFlip
+        Pad          = FFmpegFilterPad
+        Overlay      = FFmpegFilterOverlay
+        Split        = FFmpegFilterSplit
+        Volume       = FFmpegFilterVolume
         Custom       = FFmpegFilterCustom
+        Graph        = FFmpegFilterGraph
 
     # -------------------------------------------|
 
@@ -948,6 +1610,12 @@ class BrokenFFmpeg(BrokenModel):
     time: float = Field(0.0)
     """If greater than zero, stops encoding at the specified time. `-t` option of FFmpeg"""
 
+    tee: bool = Field(True)
+    """Encode once and mux all outputs with the tee muxer when they share the encoding settings
+
+    [**FFmpeg docs**](https://ffmpeg.org/ffmpeg-formats.html#tee-1)
+    """
+
     def set_time(self, time: float) -> Self:
         self.time = time
         return self
@@ -1010,6 +1678,10 @@ class BrokenFFmpeg(BrokenModel):
     """A list of inputs for FFmpeg"""
 
     filters: list[FFmpegFilterType] = Field(default_factory=list)
+    """Simple filters applied in order to the video of every output, `-vf`"""
+
+    graph: Optional[FFmpegFilterGraph] = Field(None)
+    """A complex filter graph, its unconsumed pads are mapped to outputs, `-filter_complex`"""
 
     outputs: list[FFmpegOutputType] = Field(default_factory=list)
     """A list of outputs. Yes, FFmpeg natively supports multi-encoding targets"""
@@ -1022,7 +1694,7 @@ class BrokenFFmpeg(BrokenModel):
 
     def quiet(self) -> Self:
         self.hide_banner = True
-        self.loglevel = "error"
+        self.loglevel = self.LogLevel.Error
         return self
 
     # ---------------------------------------------------------------------------------------------|
@@ -1034,6 +1706,7 @@ class BrokenFFmpeg(BrokenModel):
 
     def clear_filters(self) -> Self:
         self.filters = list()
+        self.graph = None
         return self
 
     def clear_outputs(self) -> Self:
@@ -1069,6 +1742,7 @@ class BrokenFFmpeg(BrokenModel):
 
     def add_input(self, input: FFmpegInputType) -> Self:
         self.inputs.append(input)
+        self._compiled = None
         return self
 
     @functools.wraps(FFmpegInputPath)
@@ -1086,6 +1760,7 @@ class BrokenFFmpeg(BrokenModel):
 
     def add_output(self, output: FFmpegOutputType) -> Self:
         self.outputs.append(output)
+        self._compiled = None
         return self
 
     @functools.wraps(FFmpegOutputPath)
@@ -1096,10 +1771,40 @@ class BrokenFFmpeg(BrokenModel):
     def pipe_output(self, **options) -> Self:
         return self.add_output(FFmpegOutputPipe(**options))
 
+    @functools.wraps(FFmpegOutputHLS)
+    def hls_output(self, path: Path, **options) -> Self:
+        return self.add_output(FFmpegOutputHLS(path=path, **options))
+
+    @functools.wraps(FFmpegOutputRendition)
+    def rendition(self, path: Path, **options) -> Self:
+        return self.add_output(FFmpegOutputRendition(path=path, **options))
+
+    def ladder(self,
+        path: Path,
+        heights: Iterable[Optional[int]]=(1080, 720, 480),
+        bitrates: Optional[Iterable[Optional[int]]]=None,
+        **options
+    ) -> Self:
+        """
+        Add renditions of the same source at many heights and or bitrates, decoded or piped once
+        and fanned out in a single FFmpeg with `split` and `scale` filters
+
+        ```python
+        # Writes video-1080p.mp4, video-720p.mp4 and video-480p.mp4
+        BrokenFFmpeg().input("input.mkv").ladder("video.mp4", bitrates=(6000, 3000, 1500))
+        ```
+        """
+        path = Path(path)
+        for (height, bitrate) in itertools.zip_longest(heights or (), bitrates or ()):
+            suffix = (f"{height}p" if height else f"{bitrate}k")
+            self.rendition(path.with_stem(f"{path.stem}-{suffix}"), height=height, bitrate=bitrate, **options)
+        return self
+
     def typer_outputs(self, typer: BrokenTyper) -> None:
         with typer.panel("📦 (FFmpeg) Output"):
             typer.command(FFmpegOutputPath, post=self.add_output, name="opath")
             typer.command(FFmpegOutputPipe, post=self.add_output, name="opipe")
+            typer.command(FFmpegOutputHLS,  post=self.add_output, name="ohls")
 
     # Video codecs
 
@@ -1183,8 +1888,8 @@ class BrokenFFmpeg(BrokenModel):
         return self.set_audio_codec(FFmpegAudioCodecFLAC(**options))
 
     @functools.wraps(FFmpegAudioCodecPCM)
-    def pcm(self, format: FFmpegAudioCodecPCM="pcm_f32le") -> Self:
-        return self.set_audio_codec(FFmpegAudioCodecPCM(format=format))
+    def pcm(self, format: FFmpegAudioCodecPCM="pcm_f32le", **options) -> Self:
+        return self.set_audio_codec(FFmpegAudioCodecPCM(format=format, **options))
 
     @functools.wraps(FFmpegAudioCodecCopy)
     def copy_audio(self, **options) -> Self:
@@ -1212,6 +1917,7 @@ class BrokenFFmpeg(BrokenModel):
 
     def add_filter(self, filter: FFmpegFilterType) -> Self:
         self.filters.append(filter)
+        self._compiled = None
         return self
 
     @functools.wraps(FFmpegFilterScale)
@@ -1226,6 +1932,14 @@ class BrokenFFmpeg(BrokenModel):
     def filter(self, content: str) -> Self:
         return self.add_filter(FFmpegFilterCustom(content=content))
 
+    @functools.wraps(FFmpegFilterGraph.chain)
+    def chain(self, *filters: Union[FFmpegFilterType, str], **options) -> Self:
+        """Add a chain to the complex filter graph, see `FFmpegFilterGraph`"""
+        self.graph = (self.graph or FFmpegFilterGraph())
+        self.graph.chain(*filters, **options)
+        self._compiled = None
+        return self
+
     def typer_filters(self, typer: BrokenTyper) -> None:
         with typer.panel("📦 (FFmpeg) Filters"):
             typer.command(FFmpegFilterScale,        post=self.add_filter, name="scale")
@@ -1235,14 +1949,49 @@ class BrokenFFmpeg(BrokenModel):
     # ---------------------------------------------------------------------------------------------|
     # Command building and running
 
+    _compiled: Optional[tuple[tuple, tuple[str, ...]]] = PrivateAttr(None)
+    """The last compiled command and the (instance, input files) it was built for"""
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if (name in type(self).model_fields):
+            self._compiled = None
+        super().__setattr__(name, value)
+
+    def _files(self) -> tuple[str, ...]:
+        """Identity of the input files, commands depend on their probed streams"""
+        return tuple(
+            (BrokenFFmpeg.file_key(path) if path.exists() else str(path))
+            for path in (getattr(item, "path", None) for item in self.inputs)
+            if (path is not None)
+        )
+
     @property
     def command(self) -> list[str]:
+        """
+        The FFmpeg arguments, memoized until a field is assigned or the builder methods change
+        the inputs, outputs or filters. Reassign nested models edited in place to rebuild it
+        """
         BrokenFFmpeg.install()
 
+        # Note: Copies carry the memo but not the identity, they always rebuild once
+        key = (id(self), self._files())
+
+        if (self._compiled is None) or (self._compiled[0] != key):
+            self._compiled = (key, tuple(self._command()))
+
+        return list(self._compiled[1])
+
+    def _command(self) -> list[str]:
         if (not self.inputs):
             raise ValueError("At least one input is required for FFmpeg")
         if (not self.outputs):
             raise ValueError("At least one output is required for FFmpeg")
+        if any((item.media() == "audio") for item in self.filters):
+            raise ValueError("Audio filters can't be simple video filters, add them as a chain with media='audio'")
+
+        # Filters -vf can't express are moved to an equivalent graph
+        if (self.graph is None) and (graph := self._promote()):
+            return self.model_copy(update=dict(filters=list(), graph=graph))._command()
 
         command = deque()
 
@@ -1260,30 +2009,362 @@ class BrokenFFmpeg(BrokenModel):
         extend(("-hwaccel", denum(self.hwaccel))*bool(self.hwaccel))
         extend(("-stream_loop", self.stream_loop)*bool(self.stream_loop))
         extend(self.inputs)
-        extend(("-t", self.time)*bool(self.time))
-        extend("-shortest"*self.shortest)
 
-        # Note: https://trac.ffmpeg.org/wiki/Creating%20multiple%20outputs
-        for output in self.outputs:
+        # Note: The silent track is an input, maps can only refer to ones given before them
+        if isinstance(self.audio_codec, FFmpegAudioCodecEmpty):
             extend(self.audio_codec)
-            extend(self.video_codec)
+
+        ladder = any(isinstance(output, FFmpegOutputRendition) for output in self.outputs)
+        shared = (not ladder) and self.shared
+        renames = [dict() for _ in self.outputs]
+
+        if (self.graph is not None):
+            if (self.filters):
+                raise ValueError("Simple filters can't be used with a filter graph, add them as a chain")
+            if (ladder):
+                raise ValueError("Rendition ladders build their own filter graph")
+            (graph, renames) = self._fanout(shared)
+            extend("-filter_complex", graph.check(self._streams()).string())
+
+        # Note: https://trac.ffmpeg.org/wiki/Creating%20multiple%20outputs
+        if ladder:
+            extend(self._ladder())
+        elif shared:
+            selection = self._selection()
+
+            # Note: The tee muxer has no default encoders, pick one for every kind it receives
+            audio = (self._audio_codec() or (FFmpegAudioCodecAAC() if ("audio" in selection) else FFmpegAudioCodecNone()))
+            video = (self.video_codec or (FFmpegVideoCodecH264() if ("video" in selection) else None))
+            codecs = flatten(item.command(self) for item in (audio, video) if item)
+            options = dict()
+
+            # Muxer options must be given to each slave
+            if ("-movflags" in codecs):
+                index = codecs.index("-movflags")
+                options["movflags"] = codecs.pop(index + 1)
+                codecs.pop(index)
+
+            extend(self._maps())
+            extend(self._limits())
+            extend(codecs)
             extend(every("-vf", ",".join(map(str, self.filters))))
-            extend(output)
+            extend(every("-pix_fmt", next(filter(None, (
+                denum(getattr(output, "pixel_format", None)) for output in self.outputs
+            )), None)))
+            # Note: Containers like mkv need the codec headers before the first packet
+            extend("-flags", "+global_header")
+            extend("-f", "tee", "|".join(output.tee(options) for output in self.outputs))
+        else:
+            for (output, rename) in zip(self.outputs, renames):
+                extend(self._maps(output, rename))
+                extend(self._limits())
+                extend(self._audio_codec())
+                extend(self.video_codec)
+                extend(every("-vf", ",".join(map(str, self.filters))))
+                extend(output)
 
         return list(map(str, map(denum, flatten(command))))
 
-    def run(self, **options) -> subprocess.CompletedProcess:
-        return shell(self.command, **options)
+    def _limits(self) -> tuple[str, ...]:
+        """Duration options, output options of FFmpeg that must be repeated for each one"""
+        return (("-t", self.time)*bool(self.time) + ("-shortest",)*self.shortest)
+
+    def _audio_codec(self) -> Optional[FFmpegAudioCodecType]:
+        """The audio codec options of the outputs, the silent track is an input instead"""
+        return (None if isinstance(self.audio_codec, FFmpegAudioCodecEmpty) else self.audio_codec)
+
+    def _selection(self) -> dict[str, int]:
+        """Input indices of the first video and audio streams, mimicking the default selection"""
+        def kinds(item: FFmpegInputType) -> set[str]:
+            if isinstance(item, FFmpegInputPath):
+                if (probe := BrokenFFmpeg.probe(item.path, echo=False)):
+                    return {stream.codec_type for stream in probe.streams}
+                return {"video", "audio"}
+            return {"video"}
+
+        streams = list(map(kinds, self.inputs))
+
+        # The silent track is an extra input after the others
+        if isinstance(self.audio_codec, FFmpegAudioCodecEmpty):
+            streams.append({"audio"})
+
+        selection = dict()
+        for kind in ("video", "audio"):
+            if (kind == "audio") and isinstance(self.audio_codec, FFmpegAudioCodecNone):
+                continue
+            if (index := next((i for (i, found) in enumerate(streams) if kind in found), None)) is not None:
+                selection[kind] = index
+        return selection
+
+    def _promote(self) -> Optional[FFmpegFilterGraph]:
+        """
+        The simple filters as a filter graph when any has many inputs or labelled pads, which
+        `-vf` can't express. Unlabelled filters chain on the first video stream, starting a new
+        chain at each multi-input filter to feed it the next inputs, labelled ones stand alone
+        """
+        if not any((item.inputs() > 1) or item.labelled() for item in self.filters):
+            return None
+
+        graph = FFmpegFilterGraph()
+        base = self._selection().get("video", 0)
+        extra = (index for index in range(self._streams()) if (index != base))
+        (pad, pending) = (f"{base}:v:0", list())
+
+        def flush(*inputs: str) -> None:
+            nonlocal pad
+            if pending:
+                graph.chain(*pending, inputs=(pad, *inputs), outputs=[pad := f"filter{len(graph.chains)}"])
+                pending.clear()
+
+        for item in self.filters:
+            if item.labelled():
+                (inputs, body, outputs) = item.pads()
+                graph.chain(body, inputs=inputs, outputs=(outputs or [f"filter{len(graph.chains)}"]))
+            elif (item.inputs() > 1):
+                flush()
+                pending.append(item)
+                flush(*(f"{next(extra, self._streams())}:v:0" for _ in range(item.inputs() - 1)))
+            else:
+                pending.append(item)
+
+        flush()
+        return graph
+
+    def _streams(self) -> int:
+        """Number of inputs, including the silent track's"""
+        return len(self.inputs) + isinstance(self.audio_codec, FFmpegAudioCodecEmpty)
+
+    def _fanout(self, shared: bool) -> tuple[FFmpegFilterGraph, list[dict[str, str]]]:
+        """
+        A copy of the graph where sinks mapped by many outputs are split once per output, as
+        FFmpeg can only read a pad once, and the new pad names each output must map instead
+        """
+        graph = self.graph.model_copy(deep=True)
+        media = graph.media()
+        sinks = graph.sinks()
+        renames = [dict() for _ in self.outputs]
+        consumers = [[pad for pad in (getattr(output, "maps", None) or sinks) if (pad in sinks)]
+            for output in (self.outputs[:1] if shared else self.outputs)]
+
+        for pad in sinks:
+            if len(users := [index for (index, pads) in enumerate(consumers) if (pad in pads)]) > 1:
+                graph.chain(FFmpegFilterSplit(outputs=len(users), audio=(media[pad] == "audio")),
+                    inputs=[pad], outputs=[f"{pad}_{index}" for index in users], media=media[pad])
+                for index in users:
+                    renames[index][pad] = f"{pad}_{index}"
+
+        return (graph, renames)
+
+    def _maps(self,
+        output: Optional[FFmpegOutputType]=None,
+        rename: Optional[dict[str, str]]=None,
+    ) -> Iterable[tuple[str, str]]:
+        """Stream maps of an output, nothing for FFmpeg's default selection without a graph"""
+        def label(pad: str) -> str:
+            return FFmpegFilterGraph.label((rename or {}).get(pad, pad))
+
+        if (pads := getattr(output, "maps", None)):
+            yield from (("-map", label(pad)) for pad in pads)
+        elif (self.graph is not None):
+            media = self.graph.media()
+            sinks = self.graph.sinks()
+            yield from (("-map", label(pad)) for pad in sinks)
+
+            # Note: Any map disables the default selection, keep the kinds the graph doesn't output
+            for (kind, index) in self._selection().items():
+                if (kind not in (media[pad] for pad in sinks)):
+                    yield ("-map", f"{index}:{kind[0]}:0?")
+        elif (output is None):
+            yield from (("-map", f"{index}:{kind[0]}:0?") for (kind, index) in self._selection().items())
+
+    def _source_resolution(self) -> tuple[int, int]:
+        """Resolution of the first video input"""
+        for item in self.inputs:
+            if isinstance(item, FFmpegInputPipe):
+                return (item.width, item.height)
+            if isinstance(item, FFmpegInputPath) and (probe := BrokenFFmpeg.probe(item.path, echo=False)):
+                if (stream := probe.video()):
+                    return stream.resolution
+        raise ValueError("Couldn't find the source resolution for the renditions")
+
+    def _ladder(self) -> Iterable[tuple]:
+        """Split the video once into a scaled branch per output, each with its own codecs"""
+        selection = self._selection()
+        source = self._source_resolution()
+        count = len(self.outputs)
+
+        # Note: Common filters are applied once before the split
+        graph = FFmpegFilterGraph().chain(*self.filters, FFmpegFilterSplit(outputs=count),
+            inputs=[f"{selection.get('video', 0)}:v:0"],
+            outputs=[f"split{i}" for i in range(count)],
+        )
+
+        for (i, output) in enumerate(self.outputs):
+            if isinstance(output, FFmpegOutputRendition):
+                (width, height) = output.resolution(source)
+                graph.chain(FFmpegFilterScale(width=width, height=height), inputs=[f"split{i}"], outputs=[f"out{i}"])
+            else:
+                graph.chain("null", inputs=[f"split{i}"], outputs=[f"out{i}"])
+
+        yield ("-filter_complex", graph.check(self._streams()).string())
+
+        for (i, output) in enumerate(self.outputs):
+            yield ("-map", f"[out{i}]")
+            if ("audio" in selection):
+                yield ("-map", f"{selection['audio']}:a:0?")
+            yield self._limits()
+            yield self._audio_codec()
+            yield (getattr(output, "video_codec", None) or self.video_codec)
+            yield output
+
+    @property
+    def shared(self) -> bool:
+        """Whether all outputs are muxed from a single encode, see `BrokenFFmpeg.tee`"""
+        if (len(self.outputs) < 2):
+            return False
+
+        def why() -> Optional[str]:
+            if any(isinstance(output, FFmpegOutputRendition) for output in self.outputs):
+                return "they are a rendition ladder"
+            if any(getattr(output, "maps", None) for output in self.outputs):
+                return "they map different streams"
+            if (not self.tee):
+                return "tee muxer is disabled"
+            if not all(isinstance(output, (FFmpegOutputPath, FFmpegOutputPipe)) for output in self.outputs):
+                return "some can't be tee slaves"
+            if not all(output.overwrite for output in self.outputs if isinstance(output, FFmpegOutputPath)):
+                return "some mustn't overwrite files"
+            if len(set(filter(None, (denum(output.pixel_format) for output in self.outputs)))) > 1:
+                return "their pixel formats differ"
+            return None
+
+        if (reason := why()):
+            logger.info(f"Encoding ({len(self.outputs)}) outputs separately, {reason}")
+            return False
+        logger.info(f"Encoding once for ({len(self.outputs)}) outputs with the tee muxer")
+        return True
+
+    def run(self,
+        progress: Optional[Callable[[FFmpegProgress], Any]]=None,
+        **options
+    ) -> subprocess.CompletedProcess:
+        """Run FFmpeg to completion, optionally calling `progress` with every report"""
+        if (progress is None):
+            return shell(self.validate().setup().command, **options)
+
+        # Mimic subprocess.run options on top of popen
+        input = options.pop("input", None)
+        check = options.pop("check", False)
+        if options.pop("capture_output", False):
+            options.update(stdout=PIPE, stderr=PIPE)
+        if (input is not None):
+            options["stdin"] = PIPE
+
+        # Note: Drain the pipes while waiting, FFmpeg blocks forever on a full one
+        process = self.popen(progress=progress, **options)
+        (stdout, stderr) = process.communicate(input)
+        process.progress.join()
+
+        if check and (process.returncode != 0):
+            raise subprocess.CalledProcessError(process.returncode, process.args, stdout, stderr)
+        return subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
+
+    def popen(self,
+        progress: Optional[Callable[[FFmpegProgress], Any]]=None,
+        **options
+    ) -> subprocess.Popen:
+        """
+        Start FFmpeg in the background. When `progress` is given, it's called from the thread
+        `process.progress` with a `FFmpegProgress` report every `FFmpegProgress.PERIOD` seconds
+        """
+        command = self.validate().setup().command
+
+        if (progress is not None):
+
+            # Note: A dedicated pipe keeps reports apart from logs, Windows can't inherit fds
+            if Host.OnWindows:
+                if (options.get("stderr") is not None) or options.get("capture_output"):
+                    raise ValueError("Can't capture stderr with progress reports on Windows, they share it")
+                options["stderr"] = PIPE
+                (read, write) = (None, 2)
+            else:
+                (read, write) = os.pipe()
+                options["pass_fds"] = (*options.get("pass_fds", ()), write)
+
+            command[1:1] = (
+                "-progress", f"pipe:{write}", "-nostats",
+                "-stats_period", FFmpegProgress.PERIOD,
+            )
+
+        # Note: Larger io buffers batch many small frames per syscall
+        options.setdefault("bufsize", FFmpegTransport.max_size())
+        process = shell(command, Popen=True, **options)
+        for file in (process.stdin, process.stdout):
+            FFmpegTransport.enlarge(file)
+
+        if (progress is not None):
+            if (read is not None):
+                os.close(write)
+                stream = os.fdopen(read, "rb")
+            else:
+                # The reports thread owns it, keep communicate() from reading it too
+                (stream, process.stderr) = (process.stderr, None)
+
+            def report() -> None:
+                with stream:
+                    for event in FFmpegProgress.parse(stream):
+                        progress(event)
 
-    def popen(self, **options) -> subprocess.Popen:
-        return shell(self.command, Popen=True, **options)
+            process.progress = BrokenWorker.thread(report)
+
+        return process
+
+    async def progress(self, **options) -> AsyncGenerator[FFmpegProgress, None]:
+        """Run FFmpeg yielding its progress reports, raises RuntimeError if it fails"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        process = self.popen(progress=(
+            lambda event: loop.call_soon_threadsafe(queue.put_nowait, event)
+        ), **options)
+
+        async def finish() -> None:
+            await asyncio.to_thread(process.wait)
+            await asyncio.to_thread(process.progress.join)
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        waiter = asyncio.ensure_future(finish())
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+        finally:
+            if (process.poll() is None):
+                process.kill()
+            await waiter
+
+        if (process.returncode != 0):
+            raise RuntimeError(f"FFmpeg exited with code ({process.returncode})")
+
+    def writer(self, **options) -> BrokenFrameWriter:
+        """Write frames to a pipe input from a background thread, see `BrokenFrameWriter`"""
+        return BrokenFrameWriter(ffmpeg=self, **options)
+
+    def segmented(self, **options) -> BrokenSegmentedEncoder:
+        """Encode a pipe input in chunks on parallel processes, see `BrokenSegmentedEncoder`"""
+        return BrokenSegmentedEncoder(ffmpeg=self, **options)
 
     # ---------------------------------------------------------------------------------------------|
     # High level functions
 
+    @staticmethod
+    @functools.lru_cache
+    def binary(name: str="ffmpeg") -> Optional[Path]:
+        """Resolved path of an FFmpeg binary, memoized per process until the next install"""
+        return BrokenPath.which(name)
+
     @staticmethod
     def install(raises: bool=True) -> None:
-        if all(map(BrokenPath.which, ("ffmpeg", "ffprobe"))):
+        if all(map(BrokenFFmpeg.binary, ("ffmpeg", "ffprobe"))):
             return None
 
         if (not Host.OnMacOS):
@@ -1307,13 +2388,203 @@ class BrokenFFmpeg(BrokenModel):
                 BrokenPath.make_executable(file)
 
         # Ensure the binaries are available
-        if raises and (not all(map(BrokenPath.which, ("ffmpeg", "ffprobe")))):
+        BrokenFFmpeg.binary.cache_clear()
+        if raises and (not all(map(BrokenFFmpeg.binary, ("ffmpeg", "ffprobe")))):
             raise FileNotFoundError("FFmpeg wasn't found on the system after an attempt to download it")
 
-    # # Video
+    @staticmethod
+    @functools.cache
+    def cache(name: str) -> DiskCache:
+        """A persistent DiskCache under the project's cache directory for some feature"""
+        from diskcache import Cache as DiskCache
+        return DiskCache(directory=BrokenPath.mkdir(
+            broken.project.PROJECT.DIRECTORIES.CACHE/"ffmpeg"/name
+        ))
 
     @staticmethod
-    def loop(path: Path, *, times: int=1, output: Path=None, echo: bool=True) -> Path:
+    def file_key(path: Path, *extra: Any) -> str:
+        """Identify a file's content by its (path, size, mtime) and optional extra parameters"""
+        stat = Path(path).stat()
+        return "|".join(map(str, (path, stat.st_size, stat.st_mtime_ns, *extra)))
+
+    @staticmethod
+    def file_hash(path: Path) -> str:
+        """Digest of a file's contents, memoized by its `file_key`"""
+        key = BrokenFFmpeg.file_key(path)
+        if (digest := BrokenFFmpeg.cache("hash").get(key)) is None:
+            import xxhash
+            hasher = xxhash.xxh3_128()
+            with open(path, "rb") as file:
+                while (chunk := file.read(2**20)):
+                    hasher.update(chunk)
+            BrokenFFmpeg.cache("hash").set(key, digest := hasher.hexdigest())
+        return digest
+
+    @staticmethod
+    def capabilities() -> FFmpegCapabilities:
+        """Encoders, decoders, filters and pixel formats of the current FFmpeg binary, cached
+        in memory and on disk per binary path and version"""
+        BrokenFFmpeg.install()
+        return BrokenFFmpeg._capabilities(BrokenFFmpeg.file_key(BrokenFFmpeg.binary("ffmpeg")))
+
+    @staticmethod
+    @functools.lru_cache
+    def _capabilities(key: str) -> FFmpegCapabilities:
+        if (data := BrokenFFmpeg.cache("capabilities").get(key)):
+            return FFmpegCapabilities.load(data)
+
+        binary = key.split("|")[0]
+
+        def listing(option: str) -> str:
+            return shell(binary, "-hide_banner", option, output=True, stderr=DEVNULL, echo=False)
+
+        capabilities = FFmpegCapabilities(
+            binary=binary,
+            version=str(list_get(listing("-version").split(), 2, "")),
+            encoders=FFmpegCapabilities.names(listing("-encoders"), start="------"),
+            decoders=FFmpegCapabilities.names(listing("-decoders"), start="------"),
+            pixel_formats=FFmpegCapabilities.names(listing("-pix_fmts"), start="-----"),
+
+            # Note: Filter lines are the only ones with an 'A->B' io column
+            filters={parts[1] for line in listing("-filters").splitlines()
+                if (len(parts := line.split()) >= 3) and ("->" in parts[2])},
+        )
+        logger.info(f"FFmpeg ({capabilities.version}) has ({len(capabilities.encoders)}) encoders and ({len(capabilities.filters)}) filters")
+        BrokenFFmpeg.cache("capabilities").set(key, capabilities.json())
+        return capabilities
+
+    @staticmethod
+    def encoder(codec: Union[FFmpegVideoCodecType, FFmpegAudioCodecType]) -> Optional[str]:
+        """The FFmpeg encoder name a codec module selects, if any"""
+        arguments = list(map(str, flatten(codec.command(BrokenFFmpeg()))))
+        for option in ("-c:v", "-c:a"):
+            if (option in arguments) and ((name := list_get(arguments, arguments.index(option) + 1)) not in ("copy", "null")):
+                return name
+        return None
+
+    HARDWARE_ENCODERS: ClassVar[tuple[str, ...]] = (
+        "_nvenc", "_qsv", "_vaapi", "_amf", "_videotoolbox", "_v4l2m2m", "_mf", "_vulkan",
+    )
+    """Suffixes of encoders that are listed when compiled in, but need a device to work"""
+
+    @staticmethod
+    def hardware(name: str) -> bool:
+        """Whether an encoder name is a hardware one, see `BrokenFFmpeg.HARDWARE_ENCODERS`"""
+        return name.endswith(BrokenFFmpeg.HARDWARE_ENCODERS)
+
+    @staticmethod
+    def trial(name: str) -> bool:
+        """Whether a one frame encode with a video encoder succeeds, memoized per binary"""
+        BrokenFFmpeg.install()
+        return BrokenFFmpeg._trial(BrokenFFmpeg.file_key(BrokenFFmpeg.binary("ffmpeg")), name)
+
+    @staticmethod
+    @functools.lru_cache
+    def _trial(key: str, name: str) -> bool:
+        # Note: Not cached on disk, drivers and devices come and go between runs
+        status = shell(
+            key.split("|")[0], "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "nullsrc=s=256x256", "-frames:v", "1",
+            "-c:v", name, "-f", "null", "-",
+            stdout=DEVNULL, stderr=DEVNULL, echo=False,
+        ).returncode
+        if (status != 0):
+            logger.warn(f"The encoder ({name}) is compiled in but failed a trial encode, no device?")
+        return (status == 0)
+
+    def available(self, codec: Union[FFmpegVideoCodecType, FFmpegAudioCodecType]) -> bool:
+        """Whether the current FFmpeg binary has the encoder of a codec module, hardware
+        ones must also pass a trial encode as the listing doesn't know about devices"""
+        if not (name := BrokenFFmpeg.encoder(codec)):
+            return True
+        encoders = BrokenFFmpeg.capabilities().encoders
+        if encoders and (name not in encoders):
+            return False
+        return (not BrokenFFmpeg.hardware(name)) or BrokenFFmpeg.trial(name)
+
+    def prefer(self, *codecs: FFmpegVideoCodecType) -> Self:
+        """
+        Use the first available video codec of a preference chain, from fastest to safest
+
+        ```python
+        ffmpeg.prefer(
+            BrokenFFmpeg.VideoCodec.AV1_NVENC(),
+            BrokenFFmpeg.VideoCodec.H264_NVENC(),
+            BrokenFFmpeg.VideoCodec.H264(preset="ultrafast"),
+        )
+        ```
+        """
+        for codec in codecs:
+            if self.available(codec):
+                logger.info(f"Using the video encoder ({BrokenFFmpeg.encoder(codec)}) out of the preferences")
+                return self.set_video_codec(codec)
+        raise ValueError(f"None of the preferred encoders ({', '.join(map(str, map(BrokenFFmpeg.encoder, codecs)))}) are available")
+
+    def setup(self) -> Self:
+        """Side effects the outputs need before FFmpeg starts, building commands has none"""
+        for output in self.outputs:
+            if (hook := getattr(output, "setup", None)):
+                hook()
+        return self
+
+    def validate(self) -> Self:
+        """Check the codecs, filters and pixel formats exist in the binary before spawning it"""
+        capabilities = BrokenFFmpeg.capabilities()
+
+        def check(name: Optional[str], available: set[str], what: str) -> None:
+            if name and available and (name not in available):
+                raise ValueError(f"FFmpeg ({capabilities.binary}) doesn't have the {what} ({name})")
+
+        for codec in (self.audio_codec, self.video_codec, *(
+            getattr(output, "video_codec", None) for output in self.outputs
+        )):
+            if (codec is not None):
+                check(name := BrokenFFmpeg.encoder(codec), capabilities.encoders, "encoder")
+                if name and BrokenFFmpeg.hardware(name) and (not BrokenFFmpeg.trial(name)):
+                    raise ValueError(f"FFmpeg ({capabilities.binary}) failed a trial encode with ({name}), is the device available?")
+
+        for filter in itertools.chain(self.filters, *(
+            chain.filters for chain in (self.graph.chains if self.graph else ())
+        )):
+            if not isinstance(filter, FFmpegFilterCustom):
+                check(str(filter).split("=")[0], capabilities.filters, "filter")
+
+        for item in itertools.chain(self.inputs, self.outputs):
+            check(denum(getattr(item, "pixel_format", None)), capabilities.pixel_formats, "pixel format")
+
+        return self
+
+    @staticmethod
+    def probe(path: Path, *, cache: bool=True, echo: bool=True) -> Optional[FFmpegProbe]:
+        """Get all streams and format information of a file in a single ffprobe call"""
+        if not (path := BrokenPath.get(path, exists=True)):
+            return None
+
+        # Repeated probes of the same unchanged file are free
+        key = BrokenFFmpeg.file_key(path)
+        if cache and (data := BrokenFFmpeg.cache("probe").get(key)):
+            return FFmpegProbe.load(data)
+
+        BrokenFFmpeg.install()
+        logger.info(f"Probing file ({path})")
+        try:
+            probe = FFmpegProbe.load(shell(
+                BrokenFFmpeg.binary("ffprobe"),
+                "-v", "quiet", "-i", path,
+                "-show_streams", "-show_format",
+                "-of", "json", output=True, echo=echo
+            ))
+        except subprocess.CalledProcessError:
+            logger.warn(f"Couldn't probe file ({path}), is it a media file?")
+            return None
+        if cache:
+            BrokenFFmpeg.cache("probe").set(key, probe.json())
+        return probe
+
+    # # Video
+
+    @staticmethod
+    def loop(path: Path, *, times: int=1, output: Path=None, echo: bool=True) -> Path:
         """Loop a video N times (1=original), output to a new file or replace the original"""
         if not (path := BrokenPath.get(path, exists=True)):
             return None
@@ -1349,138 +2620,615 @@ class BrokenFFmpeg(BrokenModel):
         ).stdout), formats=["jpeg"]).size
 
     @staticmethod
-    def iter_video_frames(path: Path, *, skip: int=0, echo: bool=True) -> Optional[Iterable[np.ndarray]]:
-        """Generator for every frame of the video as numpy arrays, FAST!"""
+    def iter_video_frames(
+        path: Path, *,
+        skip: int=0,
+        start: float=0.0,
+        end: Optional[float]=None,
+        pixel_format: str="rgb24",
+        copy: bool=True,
+        buffers: int=4,
+        echo: bool=True,
+    ) -> Optional[Iterable[np.ndarray]]:
+        """
+        Generator for every frame of the video as numpy arrays, FAST!
+
+        - `skip`, `start`, `end`: Read only a segment of the video, seeking to the nearest
+          keyframe before its start, so the cost is proportional to the segment length
+        - `copy=True`: Each frame is a new array owned by the caller
+        - `copy=False`: Frames are views of a ring of `buffers` preallocated arrays, which are
+          overwritten `buffers` frames later. Use `BrokenVideoReader` to hold frames for longer
+        """
         if not (path := BrokenPath.get(path, exists=True)):
             return None
-        BrokenFFmpeg.install()
-        (width, height) = BrokenFFmpeg.get_video_resolution(path)
-        logger.info(f"Streaming Video Frames from file ({path}) @ ({width}x{height})")
-        ffmpeg = (BrokenFFmpeg(vsync="cfr")
-            .quiet()
-            .input(path=path)
-            .filter(content=f"select='gte(n\\,{skip})'")
-            .rawvideo()
-            .no_audio()
-            .pipe_output(
-                pixel_format="rgb24",
-                format="rawvideo",
+
+        reader = BrokenVideoReader(
+            path=path, skip=skip,
+            start=start, end=end,
+            pixel_format=pixel_format,
+            buffers=buffers,
+        )
+
+        if copy:
+            yield from reader.arrays()
+            return
+
+        for frame in reader.frames():
+            yield frame.data
+
+    @staticmethod
+    def iter_video_frames_parallel(
+        path: Path, *,
+        workers: int=4,
+        buffer: int=64,
+        pixel_format: str="rgb24",
+        echo: bool=True,
+    ) -> Optional[Iterable[np.ndarray]]:
+        """
+        Same as `iter_video_frames`, but decoding keyframe-aligned segments of the video on up to
+        `workers` FFmpeg processes at once. Frames are yielded in presentation order, identical to
+        the serial path, with at most `buffer` decoded frames waiting in memory at any time
+        """
+        if not (path := BrokenPath.get(path, exists=True)):
+            return None
+        if (workers <= 1):
+            yield from BrokenFFmpeg.iter_video_frames(path, pixel_format=pixel_format)
+            return
+
+        framerate = BrokenFFmpeg.get_video_framerate(path)
+        total     = BrokenFFmpeg.get_video_total_frames(path)
+        BrokenFFmpeg.get_video_resolution(path)
+
+        # Split on keyframes at least 'span' frames apart, each segment queue holds that many
+        span = max(1, buffer // workers)
+        bounds = [0]
+        for index in sorted({round(stamp * framerate) for stamp in BrokenFFmpeg.get_video_keyframes(path)}):
+            if (index - bounds[-1] >= span) and (total - index >= span):
+                bounds.append(index)
+        segments = list(zip(bounds, bounds[1:] + [None]))
+        logger.info(f"Decoding ({len(segments)}) segments of video ({path}) on ({workers}) workers")
+
+        import concurrent.futures
+        import queue
+        import threading
+
+        stop = threading.Event()
+
+        def decode(start: int, end: Optional[int], frames: queue.Queue) -> None:
+            reader = BrokenVideoReader(
+                path=path, pixel_format=pixel_format,
+                start=(start / framerate),
+                end=(((end - 0.5) / framerate) if (end is not None) else None),
             )
-        ).popen(stdout=PIPE)
+            stream = reader.arrays()
+
+            # Wait for space on the queue, give up if the consumer is gone
+            def put(item: Any) -> bool:
+                while not stop.is_set():
+                    with contextlib.suppress(queue.Full):
+                        frames.put(item, timeout=0.1)
+                        return True
+                return False
+
+            try:
+                for item in itertools.chain(stream, (None,)):
+                    if not put(item):
+                        break
+            except Exception as error:
+                put(error)
+            finally:
+                stream.close()
+
+        # Only 'workers' segments are decoding or waiting to be consumed at once
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+
+            def submit(index: int) -> None:
+                if (index < len(segments)):
+                    pending.append(frames := queue.Queue(maxsize=span))
+                    pool.submit(decode, *segments[index], frames)
+
+            for index in range(workers):
+                submit(index)
+            try:
+                for index in itertools.count(workers):
+                    if (not pending):
+                        break
+                    while (item := pending[0].get()) is not None:
+                        if isinstance(item, Exception):
+                            raise item
+                        yield item
+                    pending.popleft()
+                    submit(index)
+            finally:
+                stop.set()
 
-        # Keep reading frames until we run out, each pixel is 3 bytes !
-        while (raw := ffmpeg.stdout.read(width * height * 3)):
-            yield np.frombuffer(raw, dtype=np.uint8).reshape((height, width, 3))
+    @staticmethod
+    def get_video_keyframes(path: Path, *, echo: bool=True) -> Optional[list[float]]:
+        """Timestamps of every keyframe of the first video stream, demuxing only"""
+        if not (probe := BrokenFFmpeg.probe(path)):
+            return None
+
+        key = BrokenFFmpeg.file_key(path)
+        if (keyframes := BrokenFFmpeg.cache("keyframes").get(key)) is not None:
+            return keyframes
+
+        # Note: Make timestamps relative to the start of the file, the same as seeking
+        offset = (probe.format.start_time or 0.0)
+        logger.info(f"Getting Video Keyframes of file ({path})")
+        keyframes = sorted(
+            float(time) - offset for (time, flags, *_) in (
+                line.split(",") for line in shell(
+                    BrokenFFmpeg.binary("ffprobe"),
+                    "-v", "error", "-i", path,
+                    "-select_streams", "v:0",
+                    "-show_entries", "packet=pts_time,flags",
+                    "-of", "csv=p=0",
+                    output=True
+                ).splitlines() if ("," in line)
+            ) if ("K" in flags) and (time != "N/A")
+        )
+        BrokenFFmpeg.cache("keyframes").set(key, keyframes)
+        return keyframes
 
     @staticmethod
-    def is_valid_video(path: Path, *, echo: bool=True) -> bool:
+    def is_valid_video(
+        path: Path, *,
+        level: FFmpegValidation=FFmpegValidation.Full,
+        samples: int=5,
+        cache: bool=True,
+        echo: bool=True,
+    ) -> bool:
+        """
+        Check if a file is a decodable video, see `FFmpegValidation` for the levels
+
+        - `header`: Only probe the streams, instant
+        - `sample`: Seek and decode `samples` keyframes in a single process, fast
+        - `full`: Decode the whole file to null, slow on large files
+        """
         if not (path := BrokenPath.get(path, exists=True)):
             return False
+        level = FFmpegValidation.get(level)
+
+        # Repeated checks of the same unchanged file are free
+        key = BrokenFFmpeg.file_key(path, level.value, samples*(level == FFmpegValidation.Sample))
+        if cache and ((valid := BrokenFFmpeg.cache("valid").get(key)) is not None):
+            return valid
+
         BrokenFFmpeg.install()
-        return (shell(
-            "ffmpeg", "-hide_banner", "-loglevel", "error",
-            "-i", path, "-f", "null", "-",
-            stderr=DEVNULL, stdout=DEVNULL
-        ).returncode == 0)
+
+        # Note: Without -xerror FFmpeg exits fine past corrupt or truncated packets
+        if (level == FFmpegValidation.Full):
+            valid = (shell(
+                "ffmpeg", "-hide_banner", "-loglevel", "error", "-xerror",
+                "-i", path, "-f", "null", "-",
+                stderr=DEVNULL, stdout=DEVNULL
+            ).returncode == 0)
+
+        elif not ((probe := BrokenFFmpeg.probe(path, echo=echo)) and probe.video()):
+            valid = False
+
+        elif (level == FFmpegValidation.Header):
+            valid = True
+
+        # Note: Inexact input seeking lands on keyframes, only those are decoded
+        else:
+            duration = (probe.format.duration or 0)
+            times = [duration*(index + 0.5)/samples for index in range(max(1, samples))]
+            valid = (shell(
+                "ffmpeg", "-hide_banner", "-loglevel", "error", "-xerror",
+                [("-skip_frame", "nokey", "-noaccurate_seek", "-ss", f"{time:.3f}", "-i", path) for time in times],
+                [("-map", f"{index}:v:0", "-frames:v", 1, "-f", "null", "-") for index in range(len(times))],
+                stderr=DEVNULL, stdout=DEVNULL, echo=echo
+            ).returncode == 0)
+
+        BrokenFFmpeg.cache("valid").set(key, valid)
+        return valid
 
     @staticmethod
-    @functools.lru_cache
-    def get_video_total_frames(path: Path, *, echo: bool=True) -> Optional[int]:
-        """Count the total frames of a video by decode voiding and parsing stats output"""
+    def validate_videos(
+        paths: Iterable[Path], *,
+        level: FFmpegValidation=FFmpegValidation.Sample,
+        workers: int=4,
+        **options,
+    ) -> dict[Path, bool]:
+        """Check many files concurrently with `is_valid_video`, results by the given paths"""
+        import concurrent.futures
+        paths = list(map(Path, paths))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(paths, pool.map(functools.partial(
+                BrokenFFmpeg.is_valid_video, level=level, **options
+            ), paths)))
+
+    @staticmethod
+    def thumbnails(
+        path: Path, *,
+        count: int=9,
+        tile: Optional[tuple[int, int]]=(3, 3),
+        size: tuple[int, int]=(320, 180),
+        format: Optional[Literal["jpeg", "png"]]=None,
+        echo: bool=True,
+    ) -> Optional[FFmpegThumbnails]:
+        """
+        Extract `count` keyframes nearest to evenly spaced times and tile them into a sheet
+        of (columns, rows), decoding only keyframes in a single FFmpeg process
+
+        - `size`: Each frame is fit and letterboxed into these dimensions
+        - `format`: Return encoded images instead of rgb24 arrays
+        """
         if not (path := BrokenPath.get(path, exists=True)):
             return None
+        if not (probe := BrokenFFmpeg.probe(path, echo=echo)):
+            return None
+        keyframes = (BrokenFFmpeg.get_video_keyframes(path, echo=echo) or [0.0])
+
+        # Pick the nearest keyframe to the middle of 'count' equal slices of the video
+        duration = (probe.format.duration or keyframes[-1])
+        times = sorted({min(keyframes, key=lambda time: abs(time - duration*(index + 0.5)/count))
+            for index in range(max(1, count))})
+
+        # Note: Filter timestamps aren't relative to the start of the file
+        offset = (probe.format.start_time or 0.0)
+        select = "+".join(f"lt(abs(t-{time + offset:.6f}),0.001)" for time in times)
+        width, height = size
+
         BrokenFFmpeg.install()
-        with Halo(logger.info(f"Getting total frames of video ({path}) by decoding every frame, might take a while..")):
-            return int(re.compile(r"frame=\s*(\d+)").findall((
-                BrokenFFmpeg(vsync="cfr")
-                .input(path=path)
-                .pipe_output(format="null")
-            ).run(stderr=PIPE).stderr.decode())[-1])
+        logger.info(f"Extracting ({len(times)}) thumbnails of video ({path})")
+
+        with tempfile.TemporaryDirectory(prefix="ffmpeg-thumbnails-") as temp:
+            temp = Path(temp)
+            extension = {"jpeg": "jpg", "png": "png", None: "rgb"}[format]
+
+            def output(name: str) -> tuple:
+                if (format is None):
+                    return ("-f", "rawvideo", "-pix_fmt", "rgb24", temp/f"{name}.rgb")
+                return ("-f", "image2", "-c:v", {"jpeg": "mjpeg", "png": "png"}[format],
+                    *(("-q:v", 3) if (format == "jpeg") else ()), temp/f"{name}-%04d.{extension}")
+
+            result = shell(
+                "ffmpeg", "-hide_banner", "-loglevel", "error",
+                "-skip_frame", "nokey", "-i", path, "-an", "-sn",
+                "-filter_complex", ";".join(flatten((
+                    f"[0:v:0]select='{select}',"
+                    f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+                    f"split={1 + bool(tile)}[frames]" + ("[grid]"*bool(tile)),
+                    (f"[grid]tile={tile[0]}x{tile[1]}[sheet]" if tile else None),
+                ))),
+                "-map", "[frames]", "-fps_mode", "passthrough", output("frame"),
+                (("-map", "[sheet]", "-frames:v", 1, output("sheet")) if tile else None),
+                stderr=PIPE, text=True, echo=echo
+            )
+
+            if (result.returncode != 0):
+                raise RuntimeError(f"FFmpeg exited with code ({result.returncode}) extracting thumbnails of ({path}): {result.stderr.strip()}")
+
+            def read(name: str, columns: int=1, rows: int=1) -> list[Union[np.ndarray, bytes]]:
+                if (format is not None):
+                    return [file.read_bytes() for file in sorted(temp.glob(f"{name}-*.{extension}"))]
+                if not (file := temp/f"{name}.rgb").exists():
+                    return []
+                return list(np.fromfile(file, dtype=np.uint8).reshape(-1, height*rows, width*columns, 3))
+
+            return FFmpegThumbnails(
+                times=times,
+                frames=read("frame"),
+                sheet=(list_get(read("sheet", *tile), 0) if tile else None),
+            )
+
+    @staticmethod
+    def count_video_frames(path: Path, *, exact: bool=False, echo: bool=True) -> Optional[FFmpegFrameCount]:
+        """
+        Count the total frames of a video with the cheapest method available:
+
+        - `container`: Trust the `nb_frames` written in the container's header, free
+        - `packets`: Demux only and count the video packets, no decoding
+        - `decode`: Decode every frame of the video, slow but exact (when `exact=True`)
+        """
+        if not (probe := BrokenFFmpeg.probe(path)):
+            return None
+        if not (video := probe.video()):
+            return None
+
+        # Tier 1: Free information already on the probe
+        if (not exact) and (video.nb_frames or 0) > 0:
+            return FFmpegFrameCount(frames=video.nb_frames, tier="container")
+
+        tier = FFmpegFrameCount.Tier.Decode if exact else FFmpegFrameCount.Tier.Packets
+        key  = BrokenFFmpeg.file_key(path, tier.value)
+
+        # Tier 2 and 3 are expensive, remember them
+        if (data := BrokenFFmpeg.cache("frames").get(key)):
+            return FFmpegFrameCount.load(data)
+
+        BrokenFFmpeg.install()
+
+        with Halo(str(logger.info(f"Counting frames of video ({path}) by ({tier.value}), might take a while.."))):
+            frames = int(shell(
+                BrokenFFmpeg.binary("ffprobe"),
+                "-v", "error", "-i", path,
+                "-select_streams", "v:0",
+                ("-count_frames" if exact else "-count_packets"),
+                "-show_entries", f"stream={'nb_read_frames' if exact else 'nb_read_packets'}",
+                "-of", "csv=p=0",
+                output=True
+            ).strip().splitlines()[0])
+
+        count = FFmpegFrameCount(frames=frames, tier=tier)
+        BrokenFFmpeg.cache("frames").set(key, count.json())
+        return count
+
+    @staticmethod
+    @functools.lru_cache
+    def get_video_total_frames(path: Path, *, exact: bool=False, echo: bool=True) -> Optional[int]:
+        """Count the total frames of a video, see `BrokenFFmpeg.count_video_frames`"""
+        if not (count := BrokenFFmpeg.count_video_frames(path, exact=exact)):
+            return None
+        logger.info(f"Video ({path}) has ({count.frames}) frames, from its ({denum(count.tier)})")
+        return count.frames
 
     @staticmethod
     @functools.lru_cache
     def get_video_duration(path: Path, *, echo: bool=True) -> Optional[float]:
-        if not (path := BrokenPath.get(path, exists=True)):
+        if not (probe := BrokenFFmpeg.probe(path)):
             return None
-        BrokenFFmpeg.install()
         logger.info(f"Getting Video Duration of file ({path})")
-        return float(shell(
-            BrokenPath.which("ffprobe"),
-            "-i", path,
-            "-show_entries", "format=duration",
-            "-v", "quiet", "-of", "csv=p=0",
-            output=True
-        ))
+        return probe.format.duration
 
     @staticmethod
     @functools.lru_cache
     def get_video_framerate(path: Path, *, precise: bool=False, echo: bool=True) -> Optional[float]:
-        if not (path := BrokenPath.get(path, exists=True)):
+        if not (probe := BrokenFFmpeg.probe(path)):
             return None
-        BrokenFFmpeg.install()
         logger.info(f"Getting Video Framerate of file ({path})")
         if precise:
             A = BrokenFFmpeg.get_video_total_frames(path)
             B = BrokenFFmpeg.get_video_duration(path)
             return (A/B)
-        else:
-            return float(flatten(eval(shell(
-                BrokenPath.which("ffprobe"),
-                "-i", path,
-                "-show_entries", "stream=r_frame_rate",
-                "-v", "quiet", "-of", "csv=p=0",
-                output=True
-            ).splitlines()[0]))[0])
+        elif (video := probe.video()):
+            return video.framerate
+        return None
 
     # # Audio
 
     @staticmethod
     @functools.lru_cache
     def get_audio_samplerate(path: Path, *, stream: int=0, echo: bool=True) -> Optional[int]:
-        if not (path := BrokenPath.get(path, exists=True)):
+        if not (probe := BrokenFFmpeg.probe(path)):
             return None
-        BrokenFFmpeg.install()
         logger.info(f"Getting Audio Samplerate of file ({path})")
-        return int(shell(
-            BrokenPath.which("ffprobe"),
-            "-i", path,
-            "-show_entries", "stream=sample_rate",
-            "-v", "quiet", "-of", "csv=p=0",
-            output=True
-        ).strip().splitlines()[stream])
+        if (audio := probe.audio(stream)):
+            return audio.sample_rate
+        return None
 
     @staticmethod
     @functools.lru_cache
     def get_audio_channels(path: Path, *, stream: int=0, echo: bool=True) -> Optional[int]:
-        if not (path := BrokenPath.get(path, exists=True)):
+        if not (probe := BrokenFFmpeg.probe(path)):
             return None
-        BrokenFFmpeg.install()
         logger.info(f"Getting Audio Channels of file ({path})")
-        return int(shell(
-            BrokenPath.which("ffprobe"),
-            "-i", path,
-            "-show_entries", "stream=channels",
-            "-v", "quiet", "-of", "csv=p=0",
-            output=True
-        ).strip().splitlines()[stream])
+        if (audio := probe.audio(stream)):
+            return audio.channels
+        return None
 
     @staticmethod
-    def get_audio_duration(path: Path, *, echo: bool=True) -> Optional[float]:
+    def get_audio_duration(path: Path, *, stream: int=0, echo: bool=True) -> Optional[float]:
+        """Exact duration from the header of a `get_audio_numpy` cached array, if any, probed otherwise"""
         if not (path := BrokenPath.get(path, exists=True)):
             return None
-        try:
-            generator = BrokenAudioReader(path=path, chunk=10).stream
-            while next(generator) is not None: ...
-        except StopIteration as result:
-            return result.value
+
+        # Note: Without a memoized digest there can't be a cached array, don't hash the file for it
+        if (stream == 0) and (digest := BrokenFFmpeg.cache("hash").get(BrokenFFmpeg.file_key(path))):
+            for array in BrokenFFmpeg._audio_directory().glob(f"{digest}-*.npy"):
+                samplerate = int(array.stem.split("-")[2])
+                return (len(np.load(array, mmap_mode="r")) / samplerate)
+
+        if not (probe := BrokenFFmpeg.probe(path, echo=echo)):
+            return None
+        logger.info(f"Getting Audio Duration of file ({path})")
+        if (audio := probe.audio(stream)) and audio.duration:
+            return audio.duration
+        return probe.format.duration
 
     @staticmethod
-    def get_audio_numpy(path: Path, *, echo: bool=True) -> Optional[np.ndarray]:
+    def _audio_directory() -> Path:
+        """Where `get_audio_numpy` caches decoded arrays"""
+        return BrokenPath.mkdir(broken.project.PROJECT.DIRECTORIES.CACHE/"ffmpeg"/"pcm")
+
+    @staticmethod
+    def get_audio_numpy(
+        path: Path, *,
+        format: FFmpegPCM=FFmpegPCM.PCM_FLOAT_32_BITS_LITTLE_ENDIAN,
+        samplerate: Optional[int]=None,
+        channels: Optional[int]=None,
+        cache: bool=True,
+        echo: bool=True,
+    ) -> Optional[np.memmap]:
+        """
+        Decoded audio as a read-only (samples, channels) memory map of a .npy file cached by the
+        file's contents and pcm format, so repeated loads are instant and mostly out of memory
+
+        - `cache=False`: Decode again even if a previous result exists
+        """
         if not (path := BrokenPath.get(path, exists=True)):
             return None
+        format     = FFmpegPCM.get(format)
+        samplerate = (samplerate or BrokenFFmpeg.get_audio_samplerate(path))
+        channels   = (channels   or BrokenFFmpeg.get_audio_channels(path))
+        if not (samplerate and channels):
+            return None
+        directory  = BrokenFFmpeg._audio_directory()
+        array      = directory/f"{BrokenFFmpeg.file_hash(path)}-{format.value}-{samplerate}-{channels}.npy"
+
+        if cache and array.exists():
+            os.utime(array)
+            return np.load(array, mmap_mode="r")
+
+        BrokenFFmpeg.install()
+        logger.info(f"Decoding Audio to a Numpy Array of file ({path})")
+        reader = BrokenAudioReader(path=path, format=format, samplerate=samplerate, channels=channels)
+
+        def header(samples: int) -> bytes:
+            buffer = io.BytesIO()
+            np.lib.format.write_array_header_1_0(buffer, dict(
+                descr=np.lib.format.dtype_to_descr(format.dtype),
+                fortran_order=False,
+                shape=(samples, channels),
+            ))
+            return buffer.getvalue()
+
+        # Note: The length is only known at the end, reserve a header of the widest shape to
+        # stream the samples after it once, then overwrite it padded with spaces to that size
+        reserved = len(header(2**63 - 1))
+
+        # Note: Unique names as many processes may decode the same file at once
+        with tempfile.NamedTemporaryFile(dir=directory, prefix=f"{array.stem}-", suffix=".part", delete=False) as file:
+            partial = Path(file.name)
+        try:
+            with open(partial, "wb") as file:
+                file.write(bytes(reserved))
+                try:
+                    shutil.copyfileobj(reader.open().ffmpeg.stdout, file, 2**20)
+                finally:
+                    reader.close()
+                samples = ((file.tell() - reserved) // reader.block_size)
+                file.truncate(reserved + samples*reader.block_size)
+                final = header(samples)
+                file.seek(0)
+                file.write(final[:8] + struct.pack("<H", reserved - 10))
+                file.write(final[10:-1] + b" "*(reserved - len(final)) + b"\n")
+            partial.replace(array)
+        finally:
+            partial.unlink(missing_ok=True)
+
+        BrokenPath.delete_old_files(directory, maximum=20, pattern="*.npy")
+        return np.load(array, mmap_mode="r")
+
+    # ---------------------------------------------------------------------------------------------|
+    # Benchmarking
+
+    @staticmethod
+    def bench(
+        input: Annotated[Optional[Path], Option("--input", "-i",
+            help="Clip to encode, a synthetic testsrc2 one if not given")]=None,
+        size: Annotated[str, Option("--size", "-s",
+            help="Resolution of the synthetic clip")]="1920x1080",
+        framerate: Annotated[float, Option("--framerate", "-r",
+            help="Framerate of the synthetic clip")]=60.0,
+        duration: Annotated[float, Option("--duration", "-d",
+            help="Duration in seconds of the synthetic clip")]=5.0,
+        codecs: Annotated[Optional[list[str]], Option("--codec", "-c",
+            help="Only benchmark these codec types, e.g. 'h264', repeatable")]=None,
+        presets: Annotated[bool, Option("--presets", " /--default",
+            help="Encode with every preset of each codec, or only the default one")]=True,
+        output: Annotated[Path, Option("--output", "-o",
+            help="Results table path, .json or .csv")]=Path("ffmpeg-bench.json"),
+    ) -> list[dict]:
+        """📊 Encode a clip with every available codec and preset, measuring speed and quality"""
+        import csv
+        import typing
+        try:
+            import resource
+        except ImportError:
+            resource = None
+
+        def cpu() -> Optional[float]:
+            """Seconds of CPU time of all finished child processes"""
+            if (resource is not None):
+                usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+                return (usage.ru_utime + usage.ru_stime)
+            return None
+
+        def presets_of(kind: type[FFmpegModuleBase]) -> list[Any]:
+            if (enum := getattr(kind, "Preset", None)):
+                return list(enum)
+            if (field := kind.model_fields.get("preset")) and (field.annotation in (int, "int")):
+                low  = next((item.ge for item in field.metadata if hasattr(item, "ge")), field.default)
+                high = next((item.le for item in field.metadata if hasattr(item, "le")), field.default)
+                return list(range(low, high + 1))
+            return [None]
+
         BrokenFFmpeg.install()
-        logger.info(f"Getting Audio as Numpy Array of file ({path})")
-        return np.concatenate(list(BrokenAudioReader(path=path, chunk=10).stream))
+        workspace = Path(tempfile.mkdtemp(prefix="ffmpeg-bench-"))
+        results = list()
+
+        try:
+            # Note: A lossless reference, so every encode starts from the same decoded frames
+            if (input is None):
+                source = (workspace/"source.mkv")
+                shell(
+                    "ffmpeg", "-hide_banner", "-loglevel", "error",
+                    "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={framerate}:duration={duration}",
+                    "-c:v", "ffv1", "-y", source
+                )
+            elif not (source := BrokenPath.get(input, exists=True)):
+                raise FileNotFoundError(f"Benchmark input ({input}) doesn't exist")
+
+            frames = BrokenFFmpeg.get_video_total_frames(source)
+            length = BrokenFFmpeg.get_video_duration(source)
+
+            for kind in typing.get_args(FFmpegVideoCodecType):
+                codec = kind()
+
+                if (codec.type in ("rawvideo", "null", "copy")):
+                    continue
+                if (codecs) and (codec.type not in codecs):
+                    continue
+                if not BrokenFFmpeg().available(codec):
+                    logger.warn(f"Skipping codec ({codec.type}), encoder ({BrokenFFmpeg.encoder(codec)}) isn't available")
+                    continue
+
+                for preset in (presets_of(kind) if presets else [None]):
+                    variant = (kind(preset=preset) if (preset is not None) else codec)
+                    preset = str(denum(getattr(variant, "preset", None)))
+                    target = (workspace/f"{codec.type}-{preset}.mkv")
+
+                    before, start = cpu(), time.perf_counter()
+                    if (BrokenFFmpeg().quiet().input(source).set_video_codec(variant)
+                        .no_audio().output(target, pixel_format="yuv420p").run().returncode != 0):
+                        logger.warn(f"Encoding with ({codec.type}) preset ({preset}) failed, skipping")
+                        continue
+                    elapsed = (time.perf_counter() - start)
+
+                    # Compare the encode against the reference
+                    metrics = shell(
+                        "ffmpeg", "-hide_banner", "-nostats", "-i", target, "-i", source,
+                        "-filter_complex", "[0:v]split[a][b];[1:v]split[c][d];[a][c]psnr;[b][d]ssim",
+                        "-f", "null", "-", capture_output=True, text=True,
+                    ).stderr
+                    psnr = re.search(r"PSNR .*?average:([\d.]+|inf)", metrics)
+                    ssim = re.search(r"SSIM .*?All:([\d.]+)", metrics)
+
+                    results.append(result := dict(
+                        codec=codec.type,
+                        encoder=BrokenFFmpeg.encoder(variant),
+                        preset=preset,
+                        fps=round(frames/elapsed, 2),
+                        cpu=(round(cpu() - before, 2) if (before is not None) else None),
+                        bitrate=round(target.stat().st_size*8/(length or math.inf)/1000, 1),
+                        psnr=(float(psnr.group(1)) if psnr else None),
+                        ssim=(float(ssim.group(1)) if ssim else None),
+                    ))
+                    logger.info((
+                        f"Codec ({result['codec']}) preset ({preset}) encoded at ({result['fps']} fps) "
+                        f"with ({result['cpu']}s) of CPU, ({result['bitrate']} kbps), "
+                        f"PSNR ({result['psnr']}) SSIM ({result['ssim']})"
+                    ))
+        finally:
+            BrokenPath.remove(workspace)
+
+        # Write the table
+        output = Path(output)
+        if (output.suffix == ".csv"):
+            with output.open("w", newline="", encoding="utf-8") as file:
+                writer = csv.DictWriter(file, fieldnames=list(results[0]) if results else ["codec"])
+                writer.writeheader()
+                writer.writerows(results)
+        else:
+            output.write_text(json.dumps(results, indent=2), "utf-8")
+        logger.info(f"Wrote ({len(results)}) benchmark results to ({output})")
+
+        return results
 
 # ---------------------------------------------------------------------------- #
 # BrokenFFmpeg Spin-offs
@@ -1499,16 +3247,19 @@ class BrokenAudioReader:
     """Numpy dtype out of self.format"""
 
     channels: int = None
-    """The number of audio channels in the file"""
+    """The number of audio channels to output, downmixed by FFmpeg if set, the file's otherwise"""
 
     samplerate: int = None
-    """The sample rate of the audio file"""
+    """The sample rate to output, resampled by FFmpeg if set, the file's otherwise"""
+
+    start: float = 0.0
+    """Time in seconds of the first sample to read, rounded to a whole sample, see `seek()`"""
 
     chunk: float = 0.1
     """The amount of seconds to yield data at a time"""
 
     read: int = 0
-    """Total number of bytes read from the audio file"""
+    """Total number of bytes read from the audio file since `start`"""
 
     ffmpeg: Popen = None
     """The FFmpeg reader process"""
@@ -1523,31 +3274,77 @@ class BrokenAudioReader:
 
     @property
     def time(self) -> float:
-        return (self.read / self.bytes_per_second)
+        return self.start + (self.read / self.bytes_per_second)
+
+    def open(self) -> Self:
+        self.close()
 
-    @property
-    def stream(self) -> Generator[np.ndarray, float, None]:
         if not (path := BrokenPath.get(self.path, exists=True)):
-            return None
+            raise FileNotFoundError(f"Audio file ({self.path}) doesn't exist")
         self.path = path
 
         # Get audio file attributes
-        self.channels   = BrokenFFmpeg.get_audio_channels(self.path)
-        self.samplerate = BrokenFFmpeg.get_audio_samplerate(self.path)
+        self.channels   = (self.channels   or BrokenFFmpeg.get_audio_channels(self.path))
+        self.samplerate = (self.samplerate or BrokenFFmpeg.get_audio_samplerate(self.path))
         self.format = FFmpegPCM.get(self.format)
         self.bytes_per_sample = self.format.size
         self.dtype = self.format.dtype
         self.read = 0
 
+        # Note: Positions must land on whole samples of the output rate
+        self.start = max(0, round(self.start * self.samplerate)) / self.samplerate
+
         # Note: Stderr to null as we might not read all the audio, won't log errors
         self.ffmpeg = (
             BrokenFFmpeg()
             .quiet()
-            .input(path=self.path)
-            .pcm(self.format.value)
+            .input(path=self.path, seek=(self.start or None))
+            .pcm(self.format.value, samplerate=self.samplerate, channels=self.channels)
             .no_video()
             .output("-")
         ).popen(stdout=PIPE, stderr=PIPE)
+        return self
+
+    def seek(self, seconds: float) -> Self:
+        """Restart reading at a time in seconds, FFmpeg decodes and trims up to the exact sample"""
+        self.start = seconds
+        return self.open()
+
+    def close(self) -> None:
+        if (self.ffmpeg is not None):
+            self.ffmpeg.kill()
+            self.ffmpeg.wait()
+            self.ffmpeg = None
+
+    def read_into(self, out: np.ndarray) -> int:
+        """
+        Fill a caller owned (samples, channels) array from the current position, without
+        intermediate bytes. Opens the reader if needed
+
+        Returns:
+            The number of whole samples read, fewer than requested only at the end of the file
+        """
+        if (self.ffmpeg is None):
+            self.open()
+        if (out.dtype != self.dtype) or (out.ndim != 2) or (out.shape[1] != self.channels):
+            raise ValueError(f"Buffer must be a ({self.dtype}) array of shape (samples, {self.channels})")
+        if (not out.flags.c_contiguous):
+            raise ValueError("Buffer must be C contiguous")
+
+        view, read = memoryview(out).cast("B"), 0
+        while (read < len(view)):
+            if not (length := self.ffmpeg.stdout.readinto(view[read:])):
+                break
+            read += length
+
+        self.read += read
+        return (read // self.block_size)
+
+    @property
+    def stream(self) -> Generator[np.ndarray, float, None]:
+        if not BrokenPath.get(self.path, exists=True):
+            return None
+        self.open()
 
         """
         The following code is wrong:
@@ -1561,7 +3358,7 @@ class BrokenAudioReader:
         • Small reads yields time imprecision on sample domain vs time domain
         • Must keep track of theoretical time and real time of the read
         """
-        target = 0
+        target = self.start
 
         while True:
             target += self.chunk
@@ -1580,3 +3377,1636 @@ class BrokenAudioReader:
 
         # Allow to catch total duration on GeneratorExit
         return self.time
+
+# ---------------------------------------------------------------------------- #
+
+@define
+class FFmpegAudioFeatures:
+    """A batch of audio features with one row per video frame, see `BrokenAudioAnalyzer`"""
+
+    index: int
+    """Video frame number of the first row"""
+
+    times: np.ndarray
+    """(frames,) Time in seconds of each video frame, the center of its window"""
+
+    spectrum: np.ndarray
+    """(frames, channels, bins) Magnitude of the windowed fft, see `BrokenAudioAnalyzer.frequencies`"""
+
+    rms: np.ndarray
+    """(frames, channels) Root mean square loudness of each window"""
+
+    bands: np.ndarray
+    """(frames, channels, bands) Spectral power summed between each pair of band edges"""
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+@define
+class BrokenAudioAnalyzer:
+    """
+    Streaming spectral analysis of a `BrokenAudioReader` with one window centered on each video
+    frame's time, for audio reactive renders. Samples are read directly into a buffer where only
+    the windows overlap is moved back when full, and whole batches of windows are transformed
+    at once without Python loops
+
+    ```python
+    analyzer = BrokenAudioAnalyzer(reader=BrokenAudioReader(path="song.mp3"), framerate=60)
+    for features in analyzer.features():
+        ...
+    ```
+
+    Note: Values are in the reader's sample units, use a float `format` for [-1, 1] signals
+    """
+    reader: BrokenAudioReader
+
+    framerate: float = 60.0
+    """Video framerate to align the windows to"""
+
+    fft: int = 2048
+    """Window length in samples, powers of two are the fastest"""
+
+    batch: int = 64
+    """Maximum video frames analyzed at once"""
+
+    bands: tuple[float, ...] = (20, 60, 250, 500, 2000, 4000, 6000, 20000)
+    """Edges in Hertz of the band energies, sub-bass to brilliance by default"""
+
+    @property
+    def frequencies(self) -> np.ndarray:
+        """Center frequency in Hertz of each spectrum bin"""
+        return np.fft.rfftfreq(self.fft, 1/self.reader.samplerate)
+
+    def center(self, frames: np.ndarray) -> np.ndarray:
+        """Absolute sample index at the time of some video frames"""
+        return np.round(frames * self.reader.samplerate / self.framerate).astype(np.int64)
+
+    def features(self) -> Generator[FFmpegAudioFeatures, None, None]:
+        self.reader.open()
+        half = (self.fft // 2)
+        read = math.ceil(self.batch * self.reader.samplerate / self.framerate)
+        buffer = np.zeros((4*read + 2*self.fft, self.reader.channels), dtype=self.reader.dtype)
+        window = np.hanning(self.fft).astype(np.float32)
+        edges = np.searchsorted(self.frequencies, self.bands)
+
+        # Note: Start after half a window of silence, centering the first one at time zero
+        (fill, offset, frame, end) = (half, -half, 0, None)
+
+        try:
+            while True:
+
+                # Move the next window's samples to the start when there's no room to read
+                if (fill + read + half > len(buffer)):
+                    start = int(self.center(frame)) - half - offset
+                    buffer[:fill - start] = buffer[start:fill]
+                    (offset, fill) = (offset + start, fill - start)
+
+                if (end is None):
+                    fill += (length := self.reader.read_into(buffer[fill:fill + read]))
+                    if (length < read):
+                        buffer[fill:] = 0
+                        end = (offset + fill)
+
+                # Frames with a full window, the zero padded tail ones on the end of the audio
+                while True:
+                    frames = np.arange(frame, frame + self.batch)
+                    starts = (self.center(frames) - half - offset)
+                    valid  = ((starts + self.fft <= fill) if (end is None) else (starts + half + offset < end))
+                    if not (count := int(np.count_nonzero(valid))):
+                        break
+                    yield self._analyze(buffer, frames[:count], starts[:count], window, edges)
+                    frame += count
+
+                if (end is not None):
+                    break
+        finally:
+            self.reader.close()
+
+    def _analyze(self,
+        buffer: np.ndarray,
+        frames: np.ndarray,
+        starts: np.ndarray,
+        window: np.ndarray,
+        edges: np.ndarray,
+    ) -> FFmpegAudioFeatures:
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, self.fft, axis=0)
+        samples = windows[starts].astype(np.float32, copy=False)
+        rms = np.sqrt(np.mean(np.square(samples), axis=-1))
+        samples *= window
+
+        # Note: Scaled so a full scale sine peaks at its amplitude
+        spectrum = (np.abs(np.fft.rfft(samples, axis=-1)) * (2 / window.sum())).astype(np.float32)
+        power = np.cumsum(np.square(spectrum), axis=-1)
+        power = np.concatenate((np.zeros((*power.shape[:-1], 1), dtype=power.dtype), power), axis=-1)
+
+        return FFmpegAudioFeatures(
+            index=int(frames[0]),
+            times=(frames / self.framerate),
+            spectrum=spectrum,
+            rms=rms,
+            bands=(power[..., edges[1:]] - power[..., edges[:-1]]),
+        )
+
+# ---------------------------------------------------------------------------- #
+
+@define(frozen=True)
+class FFmpegRawLayout:
+    """Memory layout of a raw video frame of some pixel format on a pipe"""
+    width: int
+    height: int
+    pixel_format: str = "rgb24"
+
+    # Bytes per pixel of packed formats
+    PACKED: ClassVar[dict[str, int]] = dict(rgb24=3, bgr24=3, rgba=4, bgra=4, gray=1)
+
+    @property
+    def chroma(self) -> tuple[int, int]:
+        """Subsampled (width, height) of the chroma planes in 4:2:0 formats"""
+        return ((self.width + 1)//2, (self.height + 1)//2)
+
+    @property
+    def size(self) -> int:
+        """Number of bytes of a single frame"""
+        (cw, ch) = self.chroma
+        if (channels := self.PACKED.get(self.pixel_format)):
+            return (self.width * self.height * channels)
+        elif self.pixel_format in ("yuv420p", "nv12"):
+            return (self.width * self.height) + (2 * cw * ch)
+        elif self.pixel_format == "yuv444p":
+            return (self.width * self.height * 3)
+        raise ValueError(f"Unsupported raw pixel format ({self.pixel_format})")
+
+    def empty(self) -> np.ndarray:
+        """A new flat buffer for a single frame"""
+        return np.empty(self.size, dtype=np.uint8)
+
+    def view(self, buffer: np.ndarray) -> Union[np.ndarray, tuple[np.ndarray, ...]]:
+        """
+        Zero-copy views of a flat frame buffer:
+
+        - Packed formats: A `(height, width, channels)` array, `(height, width)` for gray
+        - Planar formats: A tuple of `(Y, U, V)` planes, `(Y, UV)` interleaved for nv12
+        """
+        (w, h), (cw, ch) = (self.width, self.height), self.chroma
+        if (channels := self.PACKED.get(self.pixel_format)):
+            if (channels == 1):
+                return buffer.reshape(h, w)
+            return buffer.reshape(h, w, channels)
+        elif self.pixel_format == "yuv420p":
+            return (
+                buffer[:w*h].reshape(h, w),
+                buffer[w*h:w*h + cw*ch].reshape(ch, cw),
+                buffer[w*h + cw*ch:].reshape(ch, cw),
+            )
+        elif self.pixel_format == "nv12":
+            return (
+                buffer[:w*h].reshape(h, w),
+                buffer[w*h:].reshape(ch, cw, 2),
+            )
+        elif self.pixel_format == "yuv444p":
+            return tuple(buffer.reshape(3, h, w))
+        raise ValueError(f"Unsupported raw pixel format ({self.pixel_format})")
+
+    @staticmethod
+    def readinto(stream: io.BufferedIOBase, buffer: np.ndarray) -> bool:
+        """Fill a whole buffer from a stream without intermediate copies, False on end of stream"""
+        view, read = memoryview(buffer).cast("B"), 0
+        while (read < len(view)):
+            if not (length := stream.readinto(view[read:])):
+                return False
+            read += length
+        return True
+
+
+@define
+class FFmpegFrameRing:
+    """A small pool of preallocated frame buffers, recycled by lease and release"""
+    layout: FFmpegRawLayout
+
+    count: int = 4
+    """How many frame buffers to preallocate"""
+
+    buffers: list[np.ndarray] = None
+    free: deque[int] = None
+
+    def __attrs_post_init__(self):
+        self.buffers = [self.layout.empty() for _ in range(self.count)]
+        self.free = deque(range(self.count))
+
+    def acquire(self) -> int:
+        if (not self.free):
+            raise RuntimeError(f"All ({self.count}) frame buffers are leased, release some or use more buffers")
+        return self.free.popleft()
+
+    def release(self, slot: int) -> None:
+        self.free.append(slot)
+
+
+@define(eq=False)
+class FFmpegFrame:
+    """A decoded frame living on a ring buffer slot, valid until released"""
+    ring: FFmpegFrameRing
+    slot: Optional[int]
+    index: int
+
+    held: bool = False
+    """Whether the consumer leased the frame past the next iteration"""
+
+    @property
+    def buffer(self) -> np.ndarray:
+        if (self.slot is None):
+            raise RuntimeError("Frame was already released, its buffer may be overwritten")
+        return self.ring.buffers[self.slot]
+
+    @property
+    def data(self) -> Union[np.ndarray, tuple[np.ndarray, ...]]:
+        """Zero-copy view(s) of the frame, see `FFmpegRawLayout.view`"""
+        return self.ring.layout.view(self.buffer)
+
+    def copy(self) -> Union[np.ndarray, tuple[np.ndarray, ...]]:
+        """Owned view(s) of the frame, safe to keep after release"""
+        return self.ring.layout.view(self.buffer.copy())
+
+    def lease(self) -> Self:
+        """Keep the frame's buffer out of the ring until `release()` is called"""
+        self.held = True
+        return self
+
+    def release(self) -> None:
+        if (self.slot is not None):
+            self.ring.release(self.slot)
+            self.slot = None
+
+    def __enter__(self) -> Self:
+        return self.lease()
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+
+@define
+class BrokenVideoReader:
+    path: Path
+
+    skip: int = 0
+    """Number of initial frames to skip, overrides `start` if set"""
+
+    start: float = 0.0
+    """Time in seconds of the first frame to read"""
+
+    end: Optional[float] = None
+    """Time in seconds to stop reading at, exclusive"""
+
+    framerate: float = None
+    """The framerate of the video, found on the stream start"""
+
+    pixel_format: str = "rgb24"
+    """The raw pixel format to decode frames into, see `FFmpegRawLayout`"""
+
+    size: Optional[tuple[int, int]] = None
+    """Scale frames to this (width, height), decoded at the video's resolution otherwise"""
+
+    buffers: int = 4
+    """Number of preallocated frames in the ring buffer"""
+
+    layout: FFmpegRawLayout = None
+    """Memory layout of the frames, found on the stream start"""
+
+    index: int = 0
+    """Index of the next frame to be read"""
+
+    ffmpeg: Popen = None
+    """The FFmpeg reader process"""
+
+    def open(self) -> Self:
+        if not (path := BrokenPath.get(self.path, exists=True)):
+            raise FileNotFoundError(f"Video file ({self.path}) doesn't exist")
+        self.path = path
+        BrokenFFmpeg.install()
+        (width, height) = (self.size or BrokenFFmpeg.get_video_resolution(self.path))
+        self.layout = FFmpegRawLayout(width, height, denum(self.pixel_format))
+        self.framerate = BrokenFFmpeg.get_video_framerate(self.path)
+
+        # Translate frame indices into the first frame's timestamp
+        if bool(self.skip):
+            self.start = (self.skip / self.framerate)
+
+        # Note: The first frame at or after the start, tolerating float error on exact ones
+        self.index = math.ceil(self.start * self.framerate - 1e-6)
+
+        if (self.end is not None) and (self.end <= self.start):
+            raise ValueError(f"Video segment end ({self.end}) must be after its start ({self.start})")
+
+        # Note: Seek half a frame early, as the exact timestamp may round past the frame
+        seek = max(0, (self.index - 0.5) / self.framerate)
+        duration = ((self.end - seek) if (self.end is not None) else None)
+
+        logger.info(f"Streaming Video Frames from file ({self.path}) @ ({width}x{height}) from frame ({self.index})")
+        self.ffmpeg = (BrokenFFmpeg(vsync="cfr")
+            .quiet()
+            .input(path=self.path, seek=(seek or None), duration=duration)
+            .rawvideo()
+            .no_audio()
+        )
+        if (self.size is not None):
+            self.ffmpeg.scale(width=width, height=height, resample="bilinear")
+        self.ffmpeg = (self.ffmpeg
+            .pipe_output(
+                pixel_format=self.layout.pixel_format,
+                format="rawvideo",
+            )
+        ).popen(stdout=PIPE)
+        return self
+
+    def close(self) -> None:
+        if (self.ffmpeg is not None):
+            self.ffmpeg.kill()
+            self.ffmpeg.wait()
+            self.ffmpeg = None
+
+    def arrays(self) -> Generator[Union[np.ndarray, tuple[np.ndarray, ...]], None, None]:
+        """Yields new owned arrays, read directly into without intermediate bytes"""
+        self.open()
+        try:
+            while self.layout.readinto(self.ffmpeg.stdout, buffer := self.layout.empty()):
+                yield self.layout.view(buffer)
+                self.index += 1
+        finally:
+            self.close()
+
+    def frames(self) -> Generator[FFmpegFrame, None, None]:
+        """Yields ring buffer frames, recycled on the next iteration unless `lease()`d"""
+        self.open()
+        ring = FFmpegFrameRing(layout=self.layout, count=self.buffers)
+        try:
+            while True:
+                frame = FFmpegFrame(ring=ring, slot=ring.acquire(), index=self.index)
+                if not self.layout.readinto(self.ffmpeg.stdout, frame.buffer):
+                    frame.release()
+                    break
+                yield frame
+                if (not frame.held):
+                    frame.release()
+                self.index += 1
+        finally:
+            self.close()
+
+# ---------------------------------------------------------------------------- #
+
+@define
+class FFmpegFrameCache:
+    """
+    Least recently used decoded frames bounded by their total bytes, keyed by
+    (path, index, pixel format, size) and shared by every `BrokenFrameReader`
+    """
+    budget: int = 512 * 2**20
+    """Maximum bytes of frames held, the least recently used are evicted past it"""
+
+    used: int = 0
+    """Bytes of the frames currently held"""
+
+    hits: int = 0
+    """Number of lookups that found a frame"""
+
+    misses: int = 0
+    """Number of lookups that had to decode a frame"""
+
+    _frames: dict[tuple, Union[np.ndarray, tuple[np.ndarray, ...]]] = Factory(dict)
+    _lock: Lock = Factory(Lock)
+
+    @staticmethod
+    @functools.cache
+    def shared() -> FFmpegFrameCache:
+        return FFmpegFrameCache()
+
+    @staticmethod
+    def nbytes(frame: Union[np.ndarray, tuple[np.ndarray, ...]]) -> int:
+        return sum(plane.nbytes for plane in (frame if isinstance(frame, tuple) else (frame,)))
+
+    @property
+    def ratio(self) -> float:
+        """Fraction of lookups served from the cache"""
+        return (self.hits / max(1, self.hits + self.misses))
+
+    def get(self, key: tuple) -> Optional[Union[np.ndarray, tuple[np.ndarray, ...]]]:
+        with self._lock:
+            if (frame := self._frames.pop(key, None)) is None:
+                self.misses += 1
+                return None
+
+            # Note: Dictionaries keep insertion order, re-insert as the most recent
+            self._frames[key] = frame
+            self.hits += 1
+            return frame
+
+    def put(self, key: tuple, frame: Union[np.ndarray, tuple[np.ndarray, ...]]) -> None:
+        if (size := self.nbytes(frame)) > self.budget:
+            return None
+        with self._lock:
+            if (key in self._frames):
+                return None
+            self._frames[key] = frame
+            self.used += size
+            while (self.used > self.budget):
+                self.used -= self.nbytes(self._frames.pop(next(iter(self._frames))))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self.used = 0
+
+
+@define
+class BrokenFrameReader:
+    """
+    Random access to a video's frames by index, for scrubbing previews and the like. Keeps a
+    decoder warm between requests, reading forward when the target is a few frames ahead and
+    seeking otherwise, with every decoded frame going through a `FFmpegFrameCache`
+
+    ```python
+    with BrokenFrameReader("video.mp4", size=(640, 360)) as reader:
+        frame = reader[120]
+    ```
+
+    Note: Frames are read-only, as they are shared with the cache
+    """
+    path: Path = field(converter=BrokenPath.get)
+
+    pixel_format: str = "rgb24"
+    """The raw pixel format to decode frames into, see `FFmpegRawLayout`"""
+
+    size: Optional[tuple[int, int]] = None
+    """Scale frames to this (width, height), decoded at the video's resolution otherwise"""
+
+    distance: int = 48
+    """Read forward instead of seeking when the target is at most this many frames ahead"""
+
+    cache: FFmpegFrameCache = Factory(FFmpegFrameCache.shared)
+    """Decoded frames storage, shared by all readers by default"""
+
+    reader: Optional[BrokenVideoReader] = None
+    """The warm decoder, positioned at its `index` frame"""
+
+    seeks: int = 0
+    """Number of times the decoder was restarted at a new position"""
+
+    def key(self, index: int) -> tuple:
+        return (str(self.path), index, denum(self.pixel_format), self.size)
+
+    def __len__(self) -> int:
+        return (BrokenFFmpeg.get_video_total_frames(self.path) or 0)
+
+    def __getitem__(self, index: int) -> Union[np.ndarray, tuple[np.ndarray, ...]]:
+        if (index < 0):
+            index += len(self)
+        if (index < 0):
+            raise IndexError(f"Frame index ({index - len(self)}) out of range for video ({self.path})")
+
+        if (frame := self.cache.get(self.key(index))) is not None:
+            return frame
+
+        # Restart the decoder behind or too far from the target
+        if (self.reader is None) or not (0 <= (index - self.reader.index) <= self.distance):
+            self.seek(index)
+
+        # Frames on the way are likely wanted next, cache them too
+        while True:
+            buffer = self.reader.layout.empty()
+            if not self.reader.layout.readinto(self.reader.ffmpeg.stdout, buffer):
+                self.close()
+                raise IndexError(f"Frame index ({index}) past the end of video ({self.path})")
+            buffer.flags.writeable = False
+            frame = self.reader.layout.view(buffer)
+            self.cache.put(self.key(self.reader.index), frame)
+            self.reader.index += 1
+            if (self.reader.index > index):
+                return frame
+
+    def seek(self, index: int) -> None:
+        self.close()
+        self.reader = BrokenVideoReader(
+            path=self.path, skip=index,
+            pixel_format=self.pixel_format,
+            size=self.size,
+        ).open()
+        self.seeks += 1
+
+    def close(self) -> None:
+        if (self.reader is not None):
+            self.reader.close()
+            self.reader = None
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+VideoFrameReader: TypeAlias = BrokenFrameReader
+"""Alias of `BrokenFrameReader`, the name it was first proposed as"""
+
+# ---------------------------------------------------------------------------- #
+
+class FFmpegTransport(str, BrokenEnum):
+    """How raw frames travel from us to a FFmpeg process"""
+    Pipe = "pipe"
+    FIFO = "fifo"
+    Unix = "unix"
+
+    @staticmethod
+    @functools.cache
+    def max_size() -> int:
+        """Pipe buffer size to request, capped at 4 MiB as many concurrent encoders share the
+        per-user pipe pages limit, the largest an unprivileged process may ask if smaller"""
+        with contextlib.suppress(OSError, ValueError):
+            return min(2**22, int(Path("/proc/sys/fs/pipe-max-size").read_text()))
+        return 2**20
+
+    @staticmethod
+    def enlarge(file: Optional[Union[io.IOBase, int]], size: Optional[int]=None) -> int:
+        """
+        Grow a pipe's kernel buffer from the default 64 KiB, so full frames fit in fewer
+        syscalls and context switches. Halves the request until the kernel accepts it
+
+        Returns:
+            The new pipe size, or zero where it can't be changed
+        """
+        if (file is None):
+            return 0
+        try:
+            import fcntl
+            fd = (file if isinstance(file, int) else file.fileno())
+            setter = fcntl.F_SETPIPE_SZ
+        except (ImportError, AttributeError, OSError, ValueError):
+            return 0
+
+        size = (size or FFmpegTransport.max_size())
+
+        while (size >= 2**16):
+            try:
+                return fcntl.fcntl(fd, setter, size)
+            except OSError as error:
+
+                # Note: Past the per-user pipe pages limit no size is granted, keep the default
+                if (error.errno == errno.EPERM):
+                    return 0
+            size //= 2
+        return 0
+
+    @staticmethod
+    def benchmark(
+        width: int=1920,
+        height: int=1080,
+        frames: int=240,
+        transports: Optional[Iterable[FFmpegTransport]]=None,
+    ) -> dict[str, float]:
+        """
+        Compare the throughput in MB/s of each transport on synthetic rgb24 frames, consumed
+        by a FFmpeg passing them as rawvideo to a null output, so only moving bytes is timed
+
+        Returns:
+            A dictionary of transport names to their MB/s
+        """
+        frame = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+        results = dict()
+
+        for transport in map(FFmpegTransport.get, (transports or FFmpegTransport)):
+            if (transport != FFmpegTransport.Pipe) and Host.OnWindows:
+                continue
+            ffmpeg = (BrokenFFmpeg()
+                .quiet()
+                .pipe_input(width=width, height=height, framerate=60)
+                .pipe_output(format="null")
+                .rawvideo()
+            )
+            start = time.perf_counter()
+            with ffmpeg.writer(transport=transport) as writer:
+                for _ in range(frames):
+                    writer.write(frame)
+            results[transport.value] = (writer.bytes / (time.perf_counter() - start) / 1e6)
+            logger.info(f"Transport ({transport.value}) moved ({results[transport.value]:.1f} MB/s)")
+
+        return results
+
+# ---------------------------------------------------------------------------- #
+
+@define
+class BrokenFrameWriter:
+    """
+    Feed raw frames to a pipe input FFmpeg from a dedicated thread through a bounded queue,
+    so rendering the next frames overlaps with the encoder consuming the previous ones
+
+    ```python
+    with BrokenFFmpeg(...).pipe_input(...).output("video.mp4").writer() as writer:
+        for frame in frames:
+            writer.write(frame)
+    ```
+
+    Note: Frames are queued without copies, they must not be modified after being written
+    """
+    ffmpeg: BrokenFFmpeg
+
+    size: int = 8
+    """Maximum number of frames waiting on the queue, the producer blocks when full"""
+
+    transport: FFmpegTransport = FFmpegTransport.Pipe
+    """Send frames over stdin, a named fifo or an unix socket (not available on Windows)"""
+
+    process: Popen = None
+    """The FFmpeg encoder process"""
+
+    frames: int = 0
+    """Number of frames fully written to the pipe"""
+
+    bytes: int = 0
+    """Number of bytes written to the pipe"""
+
+    blocked: float = 0.0
+    """Total seconds the producer waited on a full queue (encoder is the bottleneck)"""
+
+    writing: float = 0.0
+    """Total seconds the thread spent on write calls"""
+
+    error: Optional[Exception] = None
+
+    _queue: Queue = None
+    _thread: Thread = None
+    _fd: int = None
+    _pipe: FFmpegInputPipe = None
+    _socket: Any = None
+    _temp: Path = None
+
+    @property
+    def depth(self) -> int:
+        """Number of frames currently waiting on the queue"""
+        return self._queue.qsize()
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second written to the pipe while writing"""
+        return (self.bytes / (self.writing or math.inf))
+
+    def __enter__(self) -> Self:
+        self._queue = Queue(maxsize=self.size)
+        self._pipe = next(item for item in self.ffmpeg.inputs if isinstance(item, FFmpegInputPipe))
+        self.transport = FFmpegTransport.get(self.transport)
+
+        if (self.transport == FFmpegTransport.Pipe):
+            self.process = self.ffmpeg.popen(stdin=PIPE)
+            self._fd = self.process.stdin.fileno()
+        else:
+            # Note: Frames come from elsewhere, keep FFmpeg off the terminal's stdin
+            self._temp = Path(tempfile.mkdtemp(prefix="ffmpeg-"))
+            ffmpeg = self.ffmpeg.model_copy(deep=True)
+            pipe = next(item for item in ffmpeg.inputs if isinstance(item, FFmpegInputPipe))
+            try:
+                if (self.transport == FFmpegTransport.FIFO):
+                    os.mkfifo(fifo := (self._temp/"frames.fifo"))
+                    pipe.source = str(fifo)
+                    self.process = ffmpeg.popen(stdin=DEVNULL)
+                    self._fd = self._connect(lambda: os.open(fifo, os.O_WRONLY | os.O_NONBLOCK))
+                    FFmpegTransport.enlarge(self._fd)
+                else:
+                    import socket
+                    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    server.bind(str(address := (self._temp/"frames.sock")))
+                    server.listen(1)
+                    server.setblocking(False)
+                    pipe.source = f"unix:{address}"
+                    self.process = ffmpeg.popen(stdin=DEVNULL)
+                    self._socket = self._connect(lambda: server.accept()[0])
+                    self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, FFmpegTransport.max_size())
+                    self._fd = self._socket.fileno()
+                    server.close()
+                os.set_blocking(self._fd, True)
+            except BaseException:
+                if (self.process is not None):
+                    self.process.kill()
+                BrokenPath.remove(self._temp)
+                raise
+
+        self._thread = BrokenWorker.thread(self._loop)
+        return self
+
+    def _connect(self, attempt: callable) -> Any:
+        """Retry a non-blocking open or accept until FFmpeg is on the other end"""
+        while True:
+            try:
+                return attempt()
+            except (BlockingIOError, OSError):
+                if (self.process.poll() is not None):
+                    raise RuntimeError(f"FFmpeg exited with code ({self.process.returncode}) before connecting")
+                time.sleep(0.005)
+
+    def __exit__(self, type, value, traceback) -> None:
+        if (type is None):
+            return self.close()
+        self.abort()
+
+    def write(self, frame: Union[bytes, np.ndarray]) -> None:
+        if (self.error is not None):
+            raise RuntimeError(f"Frame writer failed: {self.error}") from self.error
+        if isinstance(frame, np.ndarray):
+            frame = np.ascontiguousarray(frame)
+        start = time.perf_counter()
+        self._queue.put(frame)
+        self.blocked += (time.perf_counter() - start)
+
+    def _loop(self) -> None:
+        fd = self._fd
+
+        while (frame := self._queue.get()) is not None:
+            batch = [frame]
+
+            # Gather all frames already waiting for a single vectored write
+            with contextlib.suppress(Empty):
+                while (len(batch) < 64):
+                    if (frame := self._queue.get_nowait()) is None:
+                        self._queue.put(None)
+                        break
+                    batch.append(frame)
+
+            if (self.error is not None):
+                continue
+
+            start = time.perf_counter()
+            try:
+                views = [memoryview(self._pipe.prepare(item)).cast("B") for item in batch]
+                while views:
+                    if hasattr(os, "writev"):
+                        written = os.writev(fd, views)
+                    else:
+                        written = os.write(fd, views[0])
+                    self.bytes += written
+
+                    # Count and drop fully written views, slice a partial one
+                    while views and (written >= len(views[0])):
+                        written -= len(views.pop(0))
+                        self.frames += 1
+                    if views and written:
+                        views[0] = views[0][written:]
+            except OSError as error:
+                self.error = error
+            self.writing += (time.perf_counter() - start)
+
+    def _disconnect(self) -> None:
+        with contextlib.suppress(OSError):
+            if (self.transport == FFmpegTransport.Pipe):
+                self.process.stdin.close()
+            elif (self._socket is not None):
+                self._socket.close()
+            else:
+                os.close(self._fd)
+
+    def abort(self) -> None:
+        """Stop the encoder without finalizing, and remove the partial outputs"""
+        self.process.kill()
+
+        # Writes to the dead encoder fail, the thread then only drains the queue
+        self._queue.put(None)
+        self._thread.join()
+        self._disconnect()
+        self.process.wait()
+        if (self._temp is not None):
+            BrokenPath.remove(self._temp)
+        for output in self.ffmpeg.outputs:
+            if (path := getattr(output, "path", None)):
+                Path(path).unlink(missing_ok=True)
+        logger.warn(f"Aborted the encoder after ({self.frames}) frames, removed its outputs")
+
+    def close(self) -> None:
+        """Wait for all queued frames to be written and the encoder to finish"""
+        self._queue.put(None)
+        self._thread.join()
+        self._disconnect()
+        self.process.wait()
+        if (self._temp is not None):
+            BrokenPath.remove(self._temp)
+        logger.info((
+            f"Wrote ({self.frames}) frames at ({self.throughput/1024**2:.1f} MB/s), "
+            f"producer blocked for ({self.blocked:.2f}s)"
+        ))
+        if (self.error is not None):
+            raise RuntimeError(f"Frame writer failed: {self.error}") from self.error
+
+# ---------------------------------------------------------------------------- #
+
+@define(eq=False)
+class FFmpegChunk:
+    """A fixed length piece of a segmented encode, and its statistics"""
+    index: int
+    path: Path
+
+    frames: int = 0
+    """Number of frames sent to the chunk's encoder"""
+
+    framerate: float = 60.0
+    """The framerate of the input, for realtime speed"""
+
+    started: float = Factory(time.perf_counter)
+    elapsed: float = None
+
+    process: Popen = None
+    queue: Queue = Factory(Queue)
+    error: Optional[str] = None
+
+    @property
+    def fps(self) -> float:
+        return (self.frames / (self.elapsed or math.inf))
+
+    @property
+    def speed(self) -> float:
+        """How many times faster than realtime the chunk was encoded"""
+        return (self.fps / self.framerate)
+
+
+@define
+class BrokenSegmentedEncoder:
+    """
+    Split a pipe input's frames into fixed length chunks encoded on concurrent FFmpeg processes,
+    then join them losslessly with the concat demuxer and mux any other inputs (audio) at the end
+
+    ```python
+    with BrokenFFmpeg(...).pipe_input(...).output("video.mp4").segmented(workers=4) as encoder:
+        for frame in frames:
+            encoder.write(frame)
+    ```
+
+    With `resume=True`, completed chunks are kept on failures and listed on a manifest together
+    with the configuration hash. A later run of the same configuration skips their frames:
+
+    ```python
+    for index in range(total):
+        if encoder.completed(index):
+            encoder.skip()
+            continue
+        encoder.write(render(index))
+    ```
+
+    Note: Frames are queued without copies, they must not be modified after being written
+    """
+    ffmpeg: BrokenFFmpeg
+
+    workers: int = 4
+    """Maximum number of chunks encoding at the same time"""
+
+    chunk: int = 240
+    """Number of frames per chunk, each starts on a new keyframe (GOP)"""
+
+    buffer: int = 480
+    """Maximum number of raw frames queued in memory across all chunks"""
+
+    resume: bool = False
+    """Keep completed chunks on failures and skip them on the next run of the same configuration"""
+
+    directory: Path = None
+    """Where to write the chunks, defaults to next to the first output"""
+
+    chunks: list[FFmpegChunk] = Factory(list)
+    """All chunks so far and their encode statistics"""
+
+    checkpoints: dict[int, int] = Factory(dict)
+    """Completed chunks indices and their number of frames"""
+
+    index: int = 0
+    """The index of the next frame to be written"""
+
+    _slots: Semaphore = None
+    _permits: Semaphore = None
+    _threads: list[Thread] = Factory(list)
+    _lock: Lock = Factory(Lock)
+
+    @property
+    def pipe(self) -> FFmpegInputPipe:
+        return next(item for item in self.ffmpeg.inputs if isinstance(item, FFmpegInputPipe))
+
+    @property
+    def current(self) -> Optional[FFmpegChunk]:
+        return (self.chunks[-1] if self.chunks else None)
+
+    @property
+    def manifest(self) -> Path:
+        return (self.directory/"manifest.json")
+
+    def __enter__(self) -> Self:
+        pipes = [item for item in self.ffmpeg.inputs if isinstance(item, FFmpegInputPipe)]
+        if (len(pipes) != 1):
+            raise ValueError("Segmented encoding requires exactly one pipe input")
+        if (not self.ffmpeg.outputs) or any(not isinstance(item, FFmpegOutputPath) for item in self.ffmpeg.outputs):
+            raise ValueError("Segmented encoding requires file path outputs only")
+
+        # Hidden sibling directory of the first output
+        output = self.ffmpeg.outputs[0].path
+        self.directory = BrokenPath.get(self.directory or output.parent/f".{output.name}.chunks")
+        self._slots = Semaphore(self.workers)
+        self._permits = Semaphore(self.buffer)
+
+        # Trust previous chunks only for the very same configuration
+        if self.resume and self.manifest.exists():
+            manifest = json.loads(self.manifest.read_text("utf-8"))
+            if (manifest.get("hash") == hash(self.ffmpeg)) and (manifest.get("chunk") == self.chunk):
+                self.checkpoints = {
+                    int(index): (end - start)
+                    for (index, (start, end)) in manifest["completed"].items()
+                    if self._path(int(index)).exists()
+                }
+                logger.info(f"Resuming segmented encode with ({len(self.checkpoints)}) completed chunks from ({self.directory})")
+        if (not self.checkpoints):
+            BrokenPath.recreate(self.directory)
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        if (type is None):
+            return self.close()
+        self.abort()
+
+    def _path(self, index: int) -> Path:
+        return (self.directory/f"chunk-{index:06d}.mkv")
+
+    def completed(self, index: int) -> bool:
+        """Whether a frame index is part of a chunk completed on a previous run"""
+        return ((index // self.chunk) in self.checkpoints)
+
+    def write(self, frame: Optional[Union[bytes, np.ndarray]]) -> None:
+        """Queue a raw frame in the pipe input's format to the current chunk"""
+        if (self.index % self.chunk == 0):
+            self._next()
+        self.index += 1
+
+        # Frames of completed chunks are ignored
+        if (self.current.process is None):
+            return None
+        if (frame is None):
+            raise ValueError(f"Frame ({self.index - 1}) isn't part of a completed chunk, can't skip it")
+
+        self._permits.acquire()
+        self.current.queue.put(frame)
+        self.current.frames += 1
+
+    def skip(self) -> None:
+        """Advance one frame of a completed chunk without rendering it"""
+        self.write(None)
+
+    def _raise(self) -> None:
+        for chunk in self.chunks:
+            if (chunk.error is not None):
+                raise RuntimeError(f"Failed to encode chunk ({chunk.index}) ({chunk.path}): {chunk.error}")
+
+    def _finish(self) -> None:
+        if (self.current is not None):
+            self.current.queue.put(None)
+
+    def _next(self) -> None:
+        self._finish()
+        self._raise()
+
+        chunk = FFmpegChunk(
+            index=len(self.chunks),
+            path=self._path(len(self.chunks)),
+            framerate=self.pipe.framerate,
+        )
+
+        # Reuse a previous run's chunk
+        if (chunk.index in self.checkpoints):
+            chunk.frames = self.checkpoints[chunk.index]
+            self.chunks.append(chunk)
+            return None
+
+        self._slots.acquire()
+
+        # Same encoding settings, video only, filters are applied once here
+        ffmpeg = self.ffmpeg.model_copy(deep=True)
+        ffmpeg.clear(inputs=True, outputs=True, filters=False, video_codec=False)
+        ffmpeg.update(time=0, shortest=False, stream_loop=0)
+        ffmpeg.add_input(self.pipe.model_copy())
+        ffmpeg.output(chunk.path, pixel_format=self.ffmpeg.outputs[0].pixel_format)
+        ffmpeg.no_audio()
+
+        chunk.process = ffmpeg.popen(stdin=PIPE)
+        self.chunks.append(chunk)
+        self._threads.append(BrokenWorker.thread(self._feed, chunk))
+
+    def _feed(self, chunk: FFmpegChunk) -> None:
+        try:
+            while (frame := chunk.queue.get()) is not None:
+                try:
+                    if (chunk.error is None):
+                        chunk.process.stdin.write(self.pipe.prepare(frame))
+                except (BrokenPipeError, OSError) as error:
+                    chunk.error = str(error)
+                finally:
+                    self._permits.release()
+            with contextlib.suppress(BrokenPipeError, OSError):
+                chunk.process.stdin.close()
+            if (chunk.process.wait() != 0) and (chunk.error is None):
+                chunk.error = f"FFmpeg exited with code {chunk.process.returncode}"
+            chunk.elapsed = (time.perf_counter() - chunk.started)
+            logger.info((
+                f"Encoded chunk ({chunk.index}) of ({chunk.frames}) frames in "
+                f"({chunk.elapsed:.2f}s) at ({chunk.fps:.2f} fps) ({chunk.speed:.2f}x realtime)"
+            ))
+            if (chunk.error is None):
+                self._checkpoint(chunk)
+        finally:
+            self._slots.release()
+
+    def _checkpoint(self, chunk: FFmpegChunk) -> None:
+        """Record a completed chunk's frame range on the manifest"""
+        with self._lock:
+            self.checkpoints[chunk.index] = chunk.frames
+            self.manifest.write_text(json.dumps(dict(
+                hash=hash(self.ffmpeg),
+                chunk=self.chunk,
+                completed={
+                    index: (index*self.chunk, index*self.chunk + frames)
+                    for (index, frames) in sorted(self.checkpoints.items())
+                },
+            ), indent=2), "utf-8")
+
+    def close(self) -> None:
+        """Wait for all chunks and join them into the final outputs"""
+        self._finish()
+        for thread in self._threads:
+            thread.join()
+        try:
+            self._raise()
+            self.concat()
+        except BaseException:
+            self.abort()
+            raise
+        BrokenPath.remove(self.directory)
+
+    def concat(self) -> None:
+        listing = (self.directory/"chunks.txt")
+        listing.write_text(FFmpegInputConcat.listing(chunk.path for chunk in self.chunks))
+
+        # Stream copy the video, encode audio from the other inputs as configured
+        ffmpeg = self.ffmpeg.model_copy(deep=True)
+        ffmpeg.clear(inputs=True, filters=True, outputs=False, video_codec=True, audio_codec=False)
+        ffmpeg.update(stream_loop=0)
+        ffmpeg.add_input(FFmpegInputConcat(path=listing))
+        ffmpeg.inputs.extend(item for item in self.ffmpeg.inputs if not isinstance(item, FFmpegInputPipe))
+        ffmpeg.copy_video()
+        for output in ffmpeg.outputs:
+            output.pixel_format = None
+
+        # Note: FFmpeg 6 -shortest drops stream copied video frames, its length is known here
+        if ffmpeg.shortest:
+            duration = (sum(chunk.frames for chunk in self.chunks) / self.pipe.framerate)
+            ffmpeg.update(shortest=False, time=min(ffmpeg.time or duration, duration))
+
+        if (ffmpeg.run().returncode != 0):
+            raise RuntimeError(f"Failed to concatenate chunks from ({self.directory})")
+
+    def abort(self) -> None:
+        """Stop all encoders, remove partial chunks and all others unless resuming"""
+        for chunk in self.chunks:
+            if (chunk.process is not None):
+                chunk.process.kill()
+            chunk.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if (not self.resume):
+            BrokenPath.remove(self.directory)
+            return None
+        for chunk in self.chunks:
+            if (chunk.index not in self.checkpoints):
+                chunk.path.unlink(missing_ok=True)
+
+# ---------------------------------------------------------------------------- #
+
+class __pytest__:
+    def frames(self, count: int, width: int=64, height: int=32) -> list[np.ndarray]:
+        return [np.full((height, width, 3), index, dtype=np.uint8) for index in range(count)]
+
+    def test_writer_frames(self, tmp_path: Path):
+        self.require()
+        ffmpeg = (BrokenFFmpeg().quiet()
+            .pipe_input(width=64, height=32, framerate=10)
+            .output(tmp_path/"out.mkv"))
+        with ffmpeg.writer() as writer:
+            for frame in self.frames(25):
+                writer.write(frame)
+        assert writer.frames == 25
+        assert writer.bytes == (25*64*32*3)
+        assert writer.process.returncode == 0
+        assert BrokenFFmpeg.count_video_frames(tmp_path/"out.mkv", exact=True).frames == 25
+
+    def test_writer_abort(self, tmp_path: Path):
+        import pytest
+        self.require()
+        ffmpeg = (BrokenFFmpeg().quiet()
+            .pipe_input(width=64, height=32, framerate=10)
+            .output(tmp_path/"out.mkv"))
+        with pytest.raises(KeyboardInterrupt), ffmpeg.writer() as writer:
+            for frame in self.frames(10):
+                writer.write(frame)
+            raise KeyboardInterrupt
+        assert writer.process.returncode != 0
+        assert not (tmp_path/"out.mkv").exists()
+
+    def test_transports(self):
+        self.require()
+        results = FFmpegTransport.benchmark(width=64, height=32, frames=30)
+        assert all(speed > 0 for speed in results.values())
+        assert (FFmpegTransport.Pipe.value in results)
+
+    def test_frame_reader(self, tmp_path: Path):
+        clip = self.clip(tmp_path)
+        frames = [frame.copy() for frame in BrokenFFmpeg.iter_video_frames(clip)]
+        cache = FFmpegFrameCache()
+
+        with VideoFrameReader(clip, cache=cache, distance=3) as reader:
+            assert len(reader) == len(frames)
+            for index in (0, 2, 9, 8, 3, 9, -1):
+                assert np.array_equal(reader[index], frames[index])
+            assert (reader.seeks == 4)
+            assert (cache.hits >= 2)
+            assert not reader[0].flags.writeable
+
+        # Sharing the cache, another reader doesn't decode again
+        with BrokenFrameReader(clip, cache=cache) as other:
+            other[9]
+            assert (other.seeks == 0)
+
+    def test_audio_cache(self, tmp_path: Path):
+        self.require()
+        shell(
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "sine=duration=1.5:sample_rate=8000",
+            "-ac", 2, (audio := tmp_path/"audio.wav"), "-y"
+        )
+        array = BrokenFFmpeg.get_audio_numpy(audio, cache=False)
+        assert array.shape == (12000, 2)
+        assert BrokenFFmpeg.get_audio_duration(audio) == 1.5
+        assert not list(BrokenFFmpeg._audio_directory().glob("*.part"))
+
+    def test_probe_cache(self, tmp_path: Path):
+        clip = self.clip(tmp_path)
+        key = BrokenFFmpeg.file_key(clip)
+        assert BrokenFFmpeg.probe(clip, cache=False).video().resolution == (128, 72)
+        assert BrokenFFmpeg.cache("probe").get(key) is None
+        assert BrokenFFmpeg.probe(clip).video().framerate == 10
+        assert BrokenFFmpeg.cache("probe").get(key) is not None
+
+    def test_frames_start(self, tmp_path: Path):
+        clip = self.clip(tmp_path)
+        frames = list(BrokenFFmpeg.iter_video_frames(clip))
+        for (start, first) in ((0.2, 2), (0.25, 3), (0.3, 3), (0.31, 4)):
+            segment = list(BrokenFFmpeg.iter_video_frames(clip, start=start))
+            assert len(segment) == (len(frames) - first)
+            assert np.array_equal(segment[0], frames[first])
+        assert np.array_equal(next(iter(BrokenFFmpeg.iter_video_frames(clip, skip=7))), frames[7])
+
+    def test_command_memo(self, tmp_path: Path):
+        self.require()
+        ffmpeg = BrokenFFmpeg().input(self.clip(tmp_path)).output(tmp_path/"memo.mp4")
+        assert ffmpeg.command is not ffmpeg.command
+        assert ffmpeg.command == ffmpeg.command
+
+        # Builders, assignments and copies must all rebuild it
+        assert "-vf" in ffmpeg.scale(width=64, height=36).command
+        assert "-t" in ffmpeg.update(time=1).command
+        assert "-vf" not in ffmpeg.clear_filters().command
+        copy = ffmpeg.model_copy(deep=True)
+        copy.outputs[0].path = (tmp_path/"copy.mp4")
+        assert str(tmp_path/"copy.mp4") in copy.command
+
+    def test_filter_routing(self, tmp_path: Path):
+        import pytest
+        self.require()
+        clip = self.clip(tmp_path)
+
+        # Multi-input and labelled filters can't go in -vf
+        for (name, ffmpeg) in (
+            ("overlay.mp4", BrokenFFmpeg().input(clip).input(clip).scale(width=64, height=36)
+                .add_filter(FFmpegFilterOverlay(x=8, y=8)).vflip()),
+            ("hstack.mp4", BrokenFFmpeg().input(clip).input(clip).filter("[0:v][1:v]hstack")),
+        ):
+            ffmpeg.quiet().output(tmp_path/name)
+            assert ("-vf" not in ffmpeg.command) and ("-filter_complex" in ffmpeg.command)
+            assert ffmpeg.run().returncode == 0
+            assert BrokenFFmpeg.probe(tmp_path/name, cache=False).video()
+
+        # Audio filters on video streams and the other way around
+        for ffmpeg in (
+            BrokenFFmpeg().input(clip).add_filter(FFmpegFilterVolume()),
+            BrokenFFmpeg().input(clip).chain(FFmpegFilterVolume(), inputs=["0:a"], outputs=["audio"]),
+            BrokenFFmpeg().input(clip).chain("null", inputs=["0:v"], outputs=["video"])
+                .chain(FFmpegFilterVolume(), inputs=["video"], outputs=["audio"], media="audio"),
+            BrokenFFmpeg().input(clip).chain(FFmpegFilterScale(width=64, height=36), inputs=["0:a"], outputs=["video"]),
+        ):
+            with pytest.raises(ValueError):
+                ffmpeg.output(tmp_path/"never.mp4")._command()
+
+    def test_stream_route(self, tmp_path: Path):
+        import pytest
+        self.require()
+        pytest.importorskip("httpx")
+        pytest.importorskip("fastapi")
+        from fastapi.testclient import TestClient
+
+        from broken.server import BrokenServer
+
+        ffmpeg = (BrokenFFmpeg().quiet()
+            .input(self.clip(tmp_path)).h264(preset="ultrafast")
+            .hls_output(tmp_path/"hls"/"live.m3u8", segment=0.5))
+        assert ffmpeg.run().returncode == 0
+
+        server = BrokenServer()
+        route = server.stream(tmp_path/"hls", timeout=0.2)
+        client = TestClient(server.app)
+
+        playlist = client.get(f"{route}/live.m3u8")
+        assert playlist.status_code == 200
+        assert playlist.headers["content-type"].startswith("application/vnd.apple.mpegurl")
+        assert playlist.headers["cache-control"] == "no-cache"
+
+        # Players fetch segments in byte ranges
+        segment = next(line for line in playlist.text.splitlines() if line.endswith(".m4s"))
+        size = (tmp_path/"hls"/segment).stat().st_size
+        partial = client.get(f"{route}/{segment}", headers=dict(Range="bytes=0-99"))
+        assert partial.status_code == 206
+        assert partial.headers["content-type"].startswith("video/iso.segment")
+        assert partial.headers["content-range"] == f"bytes 0-99/{size}"
+        assert partial.content == (tmp_path/"hls"/segment).read_bytes()[:100]
+
+        # Missing files wait then fail, escaping the directory is never allowed
+        assert client.get(f"{route}/missing.m4s").status_code == 404
+        assert client.get(f"{route}/%2E%2E/clip.mkv").status_code == 404
+
+    def test_pipe_threaded_convert(self):
+        frame = np.random.randint(0, 256, (73, 130, 3), dtype=np.uint8)
+        for convert in FFmpegInputPipe.Convert:
+            (single, threaded) = (FFmpegInputPipe(width=130, height=73, convert=convert, threads=count)
+                for count in (1, 4))
+            assert threaded.threads == 4
+            assert FFmpegInputPipe().threads is None
+            assert np.array_equal(single.prepare(frame), threaded.prepare(frame))
+
+    def require(self) -> None:
+        import shutil
+
+        import pytest
+        if not shutil.which("ffmpeg"):
+            pytest.skip("FFmpeg isn't available")
+
+    def clip(self, path: Path, audio: bool=False) -> Path:
+        self.require()
+        shell(
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "testsrc2=size=128x72:rate=10:duration=1",
+            (("-f", "lavfi", "-i", "sine=duration=1", "-c:a", "flac") if audio else None),
+            "-c:v", "ffv1", (clip := path/"clip.mkv"), "-y"
+        )
+        return clip
+
+    def test_tee_default_codecs(self, tmp_path: Path):
+        ffmpeg = (BrokenFFmpeg().quiet()
+            .input(self.clip(tmp_path, audio=True))
+            .output(tmp_path/"a.mp4").output(tmp_path/"b.mkv"))
+        assert ffmpeg.shared
+        assert ffmpeg.run().returncode == 0
+        for name in ("a.mp4", "b.mkv"):
+            probe = BrokenFFmpeg.probe(tmp_path/name, cache=False)
+            assert probe.video() and probe.audio()
+
+    def test_tee_empty_audio(self, tmp_path: Path):
+        ffmpeg = (BrokenFFmpeg(shortest=True).quiet()
+            .input(self.clip(tmp_path)).empty_audio()
+            .output(tmp_path/"a.mp4").output(tmp_path/"b.mkv"))
+        assert ffmpeg.shared
+        assert ffmpeg.run().returncode == 0
+        for name in ("a.mp4", "b.mkv"):
+            assert BrokenFFmpeg.probe(tmp_path/name, cache=False).audio()
+
+    def test_graph_many_outputs(self, tmp_path: Path):
+        ffmpeg = (BrokenFFmpeg(shortest=True).quiet()
+            .input(self.clip(tmp_path)).empty_audio()
+            .chain("hflip", inputs=["0:v"], outputs=["video"])
+            .output(tmp_path/"a.mp4", pixel_format="yuv420p")
+            .output(tmp_path/"b.mkv", pixel_format="yuv444p"))
+        assert ffmpeg.run().returncode == 0
+        for name in ("a.mp4", "b.mkv"):
+            assert BrokenFFmpeg.probe(tmp_path/name, cache=False).audio()
+
+    def test_ladder_empty_audio(self, tmp_path: Path):
+        ffmpeg = (BrokenFFmpeg(shortest=True).quiet()
+            .input(self.clip(tmp_path)).empty_audio()
+            .ladder(tmp_path/"ladder.mp4", heights=(72, 36)))
+        assert ffmpeg.run().returncode == 0
+        for output in ffmpeg.outputs:
+            assert BrokenFFmpeg.probe(output.path, cache=False).audio()
+
+    def test_progress_capture(self, tmp_path: Path):
+        # Larger than a pipe buffer, would deadlock without draining
+        events = list()
+        result = (BrokenFFmpeg().quiet()
+            .input(self.clip(tmp_path))
+            .pipe_output(format="rawvideo", pixel_format="rgb24").rawvideo()
+            .run(progress=events.append, capture_output=True, check=True))
+        assert len(result.stdout) == (128*72*3*10)
+        assert events
+
+
+    def test_frame_ring(self, tmp_path: Path):
+        import pytest
+        clip = self.clip(tmp_path)
+        frames = list(BrokenVideoReader(clip).arrays())
+        assert len(frames) == 10
+
+        # Unleased frames recycle the same buffers, leased ones keep theirs
+        (reader, kept, buffers) = (BrokenVideoReader(clip, buffers=3), list(), set())
+        for frame in reader.frames():
+            assert np.array_equal(frame.data, frames[frame.index])
+            buffers.add(id(frame.buffer))
+            if (frame.index in (3, 6)):
+                kept.append(frame.lease())
+        assert len(buffers) == 3
+        for frame in kept:
+            assert np.array_equal(frame.data, frames[frame.index])
+            frame.release()
+            with pytest.raises(RuntimeError):
+                frame.copy()
+
+        # Leasing every buffer stalls the reader
+        with pytest.raises(RuntimeError):
+            for frame in BrokenVideoReader(clip, buffers=2).frames():
+                frame.lease()
+
+        # Planar views split the same flat buffer
+        planes = next(BrokenVideoReader(clip, pixel_format="yuv420p").arrays())
+        assert [plane.shape for plane in planes] == [(72, 128), (36, 64), (36, 64)]
+        assert all(plane.base is planes[0].base for plane in planes)
+
+    def test_segmented_encode(self, tmp_path: Path):
+        self.require()
+        sine = (tmp_path/"sine.flac")
+        shell("ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", "sine=duration=3", sine, "-y")
+        ffmpeg = (BrokenFFmpeg(shortest=True).quiet()
+            .pipe_input(width=64, height=32, framerate=10).input(sine)
+            .h264(preset="ultrafast").output(output := tmp_path/"out.mp4"))
+
+        with ffmpeg.segmented(workers=2, chunk=8) as encoder:
+            for frame in self.frames(25):
+                encoder.write(frame*8)
+
+        # Chunks are joined in order without losing or repeating frames
+        assert [chunk.frames for chunk in encoder.chunks] == [8, 8, 8, 1]
+        assert BrokenFFmpeg.count_video_frames(output, exact=True).frames == 25
+        assert BrokenFFmpeg.probe(output, cache=False).audio()
+        assert not encoder.directory.exists()
+        for (index, frame) in enumerate(BrokenFFmpeg.iter_video_frames(output)):
+            assert abs(float(frame.mean()) - index*8) < 2
+
+    def test_segmented_resume(self, tmp_path: Path, monkeypatch):
+        import pytest
+        self.require()
+
+        def model(crf: int=20) -> BrokenFFmpeg:
+            return (BrokenFFmpeg().quiet()
+                .pipe_input(width=64, height=32, framerate=10)
+                .h264(preset="ultrafast", crf=crf).output(tmp_path/"out.mp4"))
+
+        # Fail a render after two chunks completed
+        with pytest.raises(KeyboardInterrupt), model().segmented(chunk=8, resume=True) as encoder:
+            for frame in self.frames(17):
+                encoder.write(frame)
+            while (len(encoder.checkpoints) < 2):
+                time.sleep(0.01)
+            raise KeyboardInterrupt
+        assert sorted(encoder.checkpoints) == [0, 1]
+
+        # A new model of the same configuration on another machine resumes them
+        monkeypatch.setattr(os, "cpu_count", lambda: 97)
+        with model().segmented(chunk=8, resume=True) as encoder:
+            assert sorted(encoder.checkpoints) == [0, 1]
+            for (index, frame) in enumerate(self.frames(25)):
+                if encoder.completed(index):
+                    encoder.skip()
+                    continue
+                encoder.write(frame)
+        assert [chunk.process is None for chunk in encoder.chunks] == [True, True, False, False]
+        assert BrokenFFmpeg.count_video_frames(tmp_path/"out.mp4", exact=True).frames == 25
+
+        # Any change to the encoding settings starts over
+        with pytest.raises(KeyboardInterrupt), model().segmented(chunk=8, resume=True) as encoder:
+            for frame in self.frames(9):
+                encoder.write(frame)
+            while (not encoder.checkpoints):
+                time.sleep(0.01)
+            raise KeyboardInterrupt
+        with model(crf=30).segmented(chunk=8, resume=True) as encoder:
+            assert (not encoder.checkpoints)
+            for frame in self.frames(4):
+                encoder.write(frame)
+
+    def test_hls_output(self, tmp_path: Path):
+        self.require()
+        clip = self.clip(tmp_path, audio=True)
+
+        for (cmaf, suffix) in ((True, "m4s"), (False, "ts")):
+            playlist = (tmp_path/suffix/"live.m3u8")
+            ffmpeg = (BrokenFFmpeg().quiet().input(clip).h264(preset="ultrafast")
+                .hls_output(playlist, segment=0.5, cmaf=cmaf))
+            assert ffmpeg.run().returncode == 0
+
+            # Keyframes forced on the boundaries split the second evenly
+            lines = playlist.read_text().splitlines()
+            segments = [line for line in lines if line.endswith(f".{suffix}")]
+            durations = [float(line.split(":")[1].rstrip(",")) for line in lines if line.startswith("#EXTINF")]
+            assert (len(segments) == 2) and all(abs(item - 0.5) < 0.05 for item in durations)
+            assert ("#EXT-X-ENDLIST" in lines)
+            assert all((playlist.parent/name).exists() for name in segments)
+            assert (playlist.parent/"live-init.mp4").exists() == cmaf
+            assert not list(playlist.parent.glob("*.tmp"))
+
+    def test_progress_reports(self, tmp_path: Path):
+        import asyncio
+
+        import pytest
+        reports = list(FFmpegProgress.parse((
+            b"frame=12\n", "fps=24.5\n", "bitrate=N/A\n", "total_size=4096\n",
+            "out_time_us=500000\n", "speed=N/A\n", "unknown=value\n", "progress=continue\n",
+            "frame=30\n", "bitrate=1234.5kbits/s\n", "speed=2.5x\n", "drop_frames=1\n", "progress=end\n",
+        )))
+        assert [(item.frame, item.time, item.end) for item in reports] == [(12, 0.5, False), (30, 0.5, True)]
+        assert (reports[0].bitrate is None) and (reports[0].speed is None) and (reports[0].size == 4096)
+        assert (reports[1].bitrate == 1234.5) and (reports[1].speed == 2.5) and (reports[1].drop == 1)
+
+        # Reports of a real encode end with every frame
+        ffmpeg = BrokenFFmpeg().quiet().input(self.clip(tmp_path)).output(tmp_path/"out.mkv")
+        events = list()
+        assert ffmpeg.run(progress=events.append).returncode == 0
+        assert events[-1].end and (events[-1].frame == 10)
+        assert [item.end for item in events].count(True) == 1
+
+        async def collect(ffmpeg: BrokenFFmpeg) -> list[FFmpegProgress]:
+            return [event async for event in ffmpeg.progress()]
+
+        assert asyncio.run(collect(ffmpeg))[-1].frame == 10
+        (junk := tmp_path/"junk.mkv").write_text("Not a video")
+        with pytest.raises(RuntimeError):
+            asyncio.run(collect(ffmpeg.clear_inputs().input(junk)))
+
+    def test_capabilities(self, tmp_path: Path, monkeypatch):
+        import pytest
+        self.require()
+        capabilities = BrokenFFmpeg.capabilities()
+        assert capabilities.version and (capabilities is BrokenFFmpeg.capabilities())
+        assert {"libx264", "aac"} <= capabilities.encoders
+        assert {"scale", "overlay", "volume"} <= capabilities.filters
+        assert {"rgb24", "yuv420p"} <= capabilities.pixel_formats
+        assert BrokenFFmpeg.trial("libx264")
+        assert not BrokenFFmpeg.trial("not_an_encoder")
+
+        # Hardware encoders missing from the binary or failing a trial fall back
+        monkeypatch.setattr(BrokenFFmpeg, "trial", staticmethod(lambda name: False))
+        ffmpeg = BrokenFFmpeg().input(self.clip(tmp_path)).output(tmp_path/"out.mp4")
+        assert not ffmpeg.available(FFmpegVideoCodecH264_NVENC())
+        ffmpeg.prefer(FFmpegVideoCodecAV1_SVT(), FFmpegVideoCodecH264_NVENC(), FFmpegVideoCodecH264())
+        assert isinstance(ffmpeg.video_codec, FFmpegVideoCodecH264)
+        with pytest.raises(ValueError):
+            ffmpeg.prefer(FFmpegVideoCodecH264_NVENC())
+
+        # Nothing is spawned for configurations the binary can't run
+        with pytest.raises(ValueError):
+            ffmpeg.h264_nvenc().run()
+        monkeypatch.setattr(BrokenFFmpeg, "capabilities", staticmethod(
+            lambda: capabilities.model_copy(update=dict(encoders={"aac"}))))
+        with pytest.raises(ValueError):
+            ffmpeg.h264().run()
+        assert not (tmp_path/"out.mp4").exists()
+
+    def test_bench(self, tmp_path: Path, monkeypatch):
+        import csv
+        self.require()
+        monkeypatch.setattr(BrokenFFmpeg, "trial", staticmethod(lambda name: False))
+
+        # Unavailable hardware encoders are skipped, every preset is measured
+        results = BrokenFFmpeg.bench(
+            size="64x36", framerate=10, duration=0.5, codecs=["h264", "h264-nvenc"],
+            output=(table := tmp_path/"bench.csv"),
+        )
+        assert [item["preset"] for item in results] == list(map(denum, FFmpegVideoCodecH264.Preset))
+        for item in results:
+            assert (item["codec"], item["encoder"]) == ("h264", "libx264")
+            assert (item["fps"] > 0) and (item["bitrate"] > 0)
+            assert (item["psnr"] > 30) and (item["ssim"] > 0.9)
+
+        with table.open(newline="", encoding="utf-8") as file:
+            rows = list(csv.DictReader(file))
+        assert [row["preset"] for row in rows] == [item["preset"] for item in results]
+
+        # A user clip instead of the synthetic one
+        results = BrokenFFmpeg.bench(input=self.clip(tmp_path), codecs=["h264"], presets=False, output=tmp_path/"bench.json")
+        assert (len(results) == 1) and (json.loads((tmp_path/"bench.json").read_text())[0]["psnr"] > 30)
+
+    def test_validation_levels(self, tmp_path: Path):
+        self.require()
+        shell(
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "testsrc2=size=128x72:rate=10:duration=4",
+            "-c:v", "libx264", "-g", 7, "-movflags", "+faststart", (video := tmp_path/"video.mp4"), "-y"
+        )
+        data = video.read_bytes()
+        (truncated := tmp_path/"truncated.mp4").write_bytes(data[:len(data)*6//10])
+        (corrupt := tmp_path/"corrupt.mp4").write_bytes(data[:len(data)//2] + bytes(2000) + data[len(data)//2 + 2000:])
+        (junk := tmp_path/"junk.mp4").write_text("Not a video")
+
+        # Samples seek inexactly between keyframes, only broken files fail
+        for (path, expect) in (
+            (video,     dict(header=True,  sample=True,  full=True)),
+            (truncated, dict(header=True,  sample=False, full=False)),
+            (corrupt,   dict(header=True,  sample=False, full=False)),
+            (junk,      dict(header=False, sample=False, full=False)),
+        ):
+            for level in FFmpegValidation:
+                assert BrokenFFmpeg.is_valid_video(path, level=level, samples=7, cache=False) == expect[level.value]
+
+        results = BrokenFFmpeg.validate_videos((video, truncated, tmp_path/"missing.mp4"))
+        assert results == {video: True, truncated: False, tmp_path/"missing.mp4": False}
+
+        # Cached results are keyed on the file, not its path
+        video.write_bytes(data[:len(data)//2])
+        assert not BrokenFFmpeg.is_valid_video(video, level="sample")
+
+    def test_thumbnails(self, tmp_path: Path):
+        import pytest
+        self.require()
+        shell(
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "testsrc2=size=128x72:rate=10:duration=4",
+            "-c:v", "libx264", "-g", 10, (video := tmp_path/"video.mp4"), "-y"
+        )
+
+        # More thumbnails than keyframes repeat none of them
+        result = BrokenFFmpeg.thumbnails(video, count=9, tile=(2, 2), size=(64, 36))
+        assert result.times == [0.0, 1.0, 2.0, 3.0]
+        assert [frame.shape for frame in result.frames] == [(36, 64, 3)]*4
+        assert result.sheet.shape == (72, 128, 3)
+        assert np.array_equal(result.sheet[:36, 64:], result.frames[1])
+        assert np.array_equal(result.poster, result.frames[0])
+
+        encoded = BrokenFFmpeg.thumbnails(video, count=2, tile=None, format="png")
+        assert (len(encoded.frames) == 2) and (encoded.sheet is None)
+        assert all(frame.startswith(b"\x89PNG") for frame in encoded.frames)
+
+        # FFmpeg failures raise with its reason, unreadable files have no thumbnails
+        with pytest.raises(RuntimeError, match="tile"):
+            BrokenFFmpeg.thumbnails(video, tile=(0, 1))
+        (junk := tmp_path/"junk.mp4").write_text("Not a video")
+        assert BrokenFFmpeg.thumbnails(junk) is None
+        assert BrokenFFmpeg.thumbnails(tmp_path/"missing.mp4") is None
+
+    def test_audio_reader_seek(self, tmp_path: Path):
+        import pytest
+        self.require()
+        shell(
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "aevalsrc=t|-t:s=8000:d=2",
+            "-c:a", "pcm_f32le", (audio := tmp_path/"ramp.wav"), "-y"
+        )
+        reader = BrokenAudioReader(audio)
+        out = np.empty((4000, 2), dtype=np.float32)
+
+        # Reads are sample exact, continue where they stopped
+        for start in (0, 4000):
+            assert reader.read_into(out) == 4000
+            assert np.allclose(out[:, 0], np.arange(start, start + 4000)/8000)
+            assert np.allclose(out[:, 1], -out[:, 0])
+        assert (reader.time == 1.0)
+
+        # Seeking lands on the exact sample, the last read is short
+        for (seconds, sample) in ((1.25, 10000), (0.3, 2400), (1.00006, 8000)):
+            assert reader.seek(seconds).read_into(out[:1]) == 1
+            assert np.isclose(out[0, 0], sample/8000)
+        assert reader.seek(1.75).read_into(out) == 2000
+        assert reader.read_into(out) == 0
+        reader.close()
+
+        for buffer in (np.empty((10, 2), np.float64), np.empty((10, 1), np.float32), np.empty((2, 10), np.float32).T):
+            with pytest.raises(ValueError):
+                reader.read_into(buffer)
+        reader.close()
+
+    def test_frame_cache_budget(self):
+        frames = self.frames(4, width=10, height=10)
+        cache = FFmpegFrameCache(budget=3*300)
+        for (index, frame) in enumerate(frames[:3]):
+            cache.put(("clip", index), frame)
+
+        # The least recently used frame is evicted past the budget
+        assert cache.get(("clip", 0)) is frames[0]
+        cache.put(("clip", 3), frames[3])
+        assert cache.get(("clip", 1)) is None
+        assert all(cache.get(("clip", index)) is not None for index in (0, 2, 3))
+        assert (cache.used == 900) and (cache.hits, cache.misses) == (4, 1)
+
+        # Frames larger than the budget are never held
+        cache.put(("large", 0), np.zeros((40, 40, 3), dtype=np.uint8))
+        assert (cache.get(("large", 0)) is None) and (cache.used == 900)
+        cache.clear()
+        assert (cache.used == 0) and (cache.get(("clip", 0)) is None)
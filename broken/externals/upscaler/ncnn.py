@@ -1,5 +1,4 @@
 import io
-import shutil
 from abc import abstractmethod
 from pathlib import Path
 from subprocess import DEVNULL
@@ -78,9 +77,8 @@ class UpscalerNCNN_Base(UpscalerBase):
         ...
 
     def download(self) -> Path:
-        BrokenPath.update_externals_path()
-        if (binary := shutil.which(self._binary_name())):
-            return BrokenPath.get(binary)
+        if (binary := BrokenPath.which(self._binary_name())):
+            return binary
         EXECUTABLE = self._binary_name() + (".exe"*Host.OnWindows)
         return BrokenPath.make_executable(next(BrokenPath.get_external(self._download_url()).rglob(EXECUTABLE)))
 
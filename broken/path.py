@@ -7,9 +7,10 @@ import shutil
 from collections.abc import Generator, Iterable
 from enum import Enum
 from pathlib import Path
-from typing import Any, Optional, Union
+from typing import Any, ClassVar, Optional, Self, Union
 
 import click
+from attrs import Factory, define
 
 import broken
 import broken.project
@@ -28,6 +29,77 @@ class ShutilFormat(BrokenEnum):
     TarXz = "tar.xz"
 
 
+@define
+class ExternalsIndex:
+    """
+    Executables found under an externals directory, by name, for constant time lookups
+
+    The index is rebuilt only when any of the walked directories' modification times change,
+    which happens when files or subdirectories are added, removed or renamed in them
+    """
+    root: Path
+
+    mtimes: dict[Path, int] = Factory(dict)
+    """Modification times of every indexed directory"""
+
+    binaries: dict[str, Path] = Factory(dict)
+    """First file found by its name, and stem for Windows executables"""
+
+    prepended: set[Path] = Factory(set)
+    """Directories already added to PATH, each one only once per process"""
+
+    @staticmethod
+    def executable(path: Path) -> bool:
+        if Host.OnWindows:
+            return (path.suffix.upper() in os.getenv("PATHEXT", ".EXE").split(os.pathsep))
+        return os.access(path, os.X_OK)
+
+    def stale(self) -> bool:
+        if (not self.mtimes):
+            return True
+        for (directory, mtime) in self.mtimes.items():
+            try:
+                if (os.stat(directory).st_mtime_ns != mtime):
+                    return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def update(self, *, path: bool=True) -> Self:
+        if (not self.stale()):
+            return self
+
+        self.mtimes.clear()
+        self.binaries.clear()
+
+        for (directory, _, files) in os.walk(self.root):
+            directory = Path(directory)
+            self.mtimes[directory] = os.stat(directory).st_mtime_ns
+
+            for name in sorted(files):
+                file = (directory/name)
+                self.binaries.setdefault(name, file)
+                if Host.OnWindows:
+                    self.binaries.setdefault(file.stem, file)
+                if path and self.executable(file):
+                    self.prepend(directory)
+
+        return self
+
+    def prepend(self, directory: Path) -> None:
+        if (directory not in self.prepended):
+            self.prepended.add(directory)
+            if (not Environment.in_path(directory)):
+                Environment.add_to_path(directory)
+
+    def which(self, name: str, *, path: bool=True) -> Optional[Path]:
+        if (binary := self.update(path=path).binaries.get(name)) and self.executable(binary):
+            if path:
+                self.prepend(binary.parent)
+            return binary
+        return None
+
+
 class BrokenPath(StaticClass):
 
     def get(
@@ -404,20 +476,22 @@ class BrokenPath(StaticClass):
         if ARCHIVE:
             file = BrokenPath.extract(file)
 
-        for item in file.rglob("*"):
-            if item.is_dir():
-                Environment.add_to_path(item)
-
+        BrokenPath.update_externals_path()
         return file
 
-    def which(name: str) -> Optional[Path]:
-        BrokenPath.update_externals_path()
-        return BrokenPath.get(shutil.which(name))
+    _externals: ClassVar[dict[Path, ExternalsIndex]] = {}
+
+    def externals(path: Optional[Path]=None) -> ExternalsIndex:
+        """Get the executables index of an externals directory, defaults to the workspace's"""
+        path = BrokenPath.get(path or broken.project.BROKEN.DIRECTORIES.EXTERNALS)
+        return BrokenPath._externals.setdefault(path, ExternalsIndex(root=path))
+
+    def which(name: str, *, externals: Optional[Path]=None) -> Optional[Path]:
+        """Find a binary in the externals directory first, then in the system PATH"""
+        return (BrokenPath.externals(externals).which(name) or BrokenPath.get(shutil.which(name)))
 
     def update_externals_path(path: Path=None, *, echo: bool=True) -> Optional[Path]:
-        for item in (path := (path or broken.project.BROKEN.DIRECTORIES.EXTERNALS)).rglob("*"):
-            if item.is_dir(): Environment.add_to_path(item)
-        return path
+        return BrokenPath.externals(path).update().root
 
     @staticmethod
     def directories(path: Union[Path, Iterable]) -> Iterable[Path]:
@@ -436,14 +510,15 @@ class BrokenPath(StaticClass):
                 yield item
 
     @staticmethod
-    def delete_old_files(path: Path, maximum: int=20) -> None:
-        files = list(os.scandir(path))
+    def delete_old_files(path: Path, maximum: int=20, pattern: str="*") -> None:
+        """Keep only the `maximum` most recently modified files matching a glob pattern"""
+        files = list(Path(path).glob(pattern))
 
         if (overflow := (len(files) - maximum)) > 0:
             files = sorted(files, key=os.path.getmtime)
 
             for file in itertools.islice(files, overflow):
-                os.unlink(file.path)
+                os.unlink(file)
 
     # # Specific / "Utils"
 
@@ -511,3 +586,28 @@ class BrokenPath(StaticClass):
         def Pictures(*, type: Type=Type.Current) -> Path:
             return BrokenPath.Windows.get(BrokenPath.Windows.Magic.Pictures, type=type)
 
+# ---------------------------------------------------------------------------- #
+
+class __pytest__:
+    def executable(self, path: Path) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("#!/bin/sh\n")
+        return BrokenPath.make_executable(path)
+
+    def test_externals_which(self, tmp_path: Path, monkeypatch):
+        monkeypatch.setenv("PATH", os.getenv("PATH", ""))
+        for name in ("alpha", "beta", "gamma"):
+            self.executable(tmp_path/name/"bin"/(name + ".exe"*Host.OnWindows))
+
+        length = len(Environment.PATH())
+        for _ in range(5000):
+            assert BrokenPath.which("beta", externals=tmp_path).parent.name == "bin"
+        assert len(Environment.PATH()) <= length + 3
+        assert BrokenPath.which("missing", externals=tmp_path) is None
+
+    def test_externals_invalidation(self, tmp_path: Path, monkeypatch):
+        monkeypatch.setenv("PATH", os.getenv("PATH", ""))
+        assert BrokenPath.which("delta", externals=tmp_path) is None
+        self.executable(tmp_path/"new"/("delta" + ".exe"*Host.OnWindows))
+        assert BrokenPath.which("delta", externals=tmp_path) is not None
+
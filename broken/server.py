@@ -2,11 +2,13 @@ import asyncio
 import json
 import time
 from base64 import b64encode
-from typing import Annotated
+from pathlib import Path
+from typing import Annotated, ClassVar
 
 import uvicorn
 from attrs import Factory, define
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse
 from typer import Option
 
 from broken.system import Host
@@ -94,6 +96,54 @@ class BrokenServer:
         while bool(block):
             time.sleep(1)
 
+    # -------------------------------------------|
+    # Streaming
+
+    # Content types of HLS playlists and segments
+    STREAMING: ClassVar[dict[str, str]] = {
+        ".m3u8": "application/vnd.apple.mpegurl",
+        ".m4s":  "video/iso.segment",
+        ".mp4":  "video/mp4",
+        ".ts":   "video/mp2t",
+    }
+
+    def stream(self,
+        directory: Path,
+        route: str="/stream",
+        timeout: float=10.0,
+    ) -> str:
+        """
+        Serve the files of a directory as a live encode writes them, e.g. a `FFmpegOutputHLS`.
+        Requests for files that don't exist yet wait for up to `timeout` seconds for them
+
+        Returns:
+            The route the files are served at
+        """
+        directory = Path(directory).resolve()
+        route = route.rstrip("/")
+
+        @self.app.get(route + "/{name:path}")
+        async def segment(name: str) -> FileResponse:
+            path = (directory/name).resolve()
+
+            if (directory not in path.parents):
+                raise HTTPException(status_code=404)
+
+            # Segments are renamed into place only when complete
+            start = time.monotonic()
+            while not path.exists():
+                if (time.monotonic() - start > timeout):
+                    raise HTTPException(status_code=404)
+                await asyncio.sleep(0.1)
+
+            # Note: Playlists grow as segments are added, never cache them
+            return FileResponse(path,
+                media_type=self.STREAMING.get(path.suffix, "application/octet-stream"),
+                headers={"Cache-Control": ("no-cache" if (path.suffix == ".m3u8") else "max-age=3600")},
+            )
+
+        return route
+
     # -------------------------------------------|
     # Cloud providers
 
@@ -1,9 +1,14 @@
-from typing import Optional, Union
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import ClassVar, Literal, Optional, Union
 
 import numpy as np
 import xxhash
 from PIL.Image import Image as ImageType
 
+from broken.enumx import BrokenEnum
+from broken.utils import denum
+
 
 class Vectron:
 
@@ -77,3 +82,176 @@ class Vectron:
             den *= normalize
 
         return (int(num), int(den))
+
+    # ------------------------------------------------------------------------------------------- #
+    # Color conversion
+
+    class Matrix(str, BrokenEnum):
+        BT709 = "bt709"
+        BT601 = "bt601"
+
+    # Luma (Kr, Kb) coefficients of each matrix
+    LUMA: ClassVar[dict[str, tuple[float, float]]] = dict(bt709=(0.2126, 0.0722), bt601=(0.299, 0.114))
+
+    @staticmethod
+    def rgb_to_yuv(
+        rgb: np.ndarray, *,
+        format: Literal["yuv420p", "nv12"]="yuv420p",
+        matrix: Matrix=Matrix.BT709,
+        out: Optional[np.ndarray]=None,
+        threads: int=1,
+    ) -> np.ndarray:
+        """
+        Convert a (height, width, 3+) uint8 rgb image to limited range 4:2:0 yuv, the layout
+        FFmpeg expects of a raw frame, half the size of rgb24. Chroma is the 2x2 average
+
+        Args:
+            format: Planar `yuv420p` or interleaved chroma `nv12`
+            out: Optional flat uint8 buffer to write into, of `w*h + 2*ceil(w/2)*ceil(h/2)` bytes
+            threads: Split the work in row bands on many threads
+
+        Returns:
+            The flat frame buffer, `out` if given
+        """
+        (height, width) = rgb.shape[:2]
+        (cw, ch) = ((width + 1)//2, (height + 1)//2)
+        (kr, kb) = Vectron.LUMA[denum(matrix)]
+        kg = (1 - kr - kb)
+
+        if (out is None):
+            out = np.empty(width*height + 2*cw*ch, dtype=np.uint8)
+        luma = out[:width*height].reshape(height, width)
+        if (format == "yuv420p"):
+            u = out[width*height:][:cw*ch].reshape(ch, cw)
+            v = out[width*height:][cw*ch:].reshape(ch, cw)
+        elif (format == "nv12"):
+            uv = out[width*height:].reshape(ch, cw, 2)
+            (u, v) = (uv[..., 0], uv[..., 1])
+        else:
+            raise ValueError(f"Unsupported yuv format ({format})")
+
+        def band(start: int, end: int) -> None:
+            (r, g, b) = (rgb[start:end, :, i].astype(np.float32) for i in range(3))
+
+            # Note: Adding 0.5 before truncation rounds, limited range never overflows
+            luma[start:end] = (kr*r + kg*g + kb*b)*(219/255) + 16.5
+
+            # Replicate the last row and column of odd sizes, average 2x2 blocks
+            if (r.shape[0] % 2) or (width % 2):
+                (r, g, b) = (np.pad(x, ((0, r.shape[0] % 2), (0, width % 2)), mode="edge") for x in (r, g, b))
+            (r, g, b) = ((x[0::2, 0::2] + x[1::2, 0::2] + x[0::2, 1::2] + x[1::2, 1::2])*0.25 for x in (r, g, b))
+            shade = (kr*r + kg*g + kb*b)
+            u[start//2:(end + 1)//2] = (b - shade)*(224/255/(2*(1 - kb))) + 128.5
+            v[start//2:(end + 1)//2] = (r - shade)*(224/255/(2*(1 - kr))) + 128.5
+
+        # Even sized bands so chroma rows don't straddle two of them
+        step = max(2, ((height // max(1, threads)) + 1) // 2 * 2)
+        bands = [(start, min(start + step, height)) for start in range(0, height, step)]
+
+        if (threads > 1) and (len(bands) > 1):
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(lambda args: band(*args), bands))
+        else:
+            for args in bands:
+                band(*args)
+
+        return out
+
+    @staticmethod
+    def yuv_benchmark(
+        width: int=1920,
+        height: int=1080,
+        frames: int=60,
+        threads: tuple[int, ...]=(1, 2, 4, 8),
+    ) -> dict[int, float]:
+        """Frames per second of `rgb_to_yuv` for some thread counts on random images"""
+        rgb = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+        out = np.empty(width*height + 2*((width + 1)//2)*((height + 1)//2), dtype=np.uint8)
+        results = dict()
+
+        for count in threads:
+            start = time.perf_counter()
+            for _ in range(frames):
+                Vectron.rgb_to_yuv(rgb, out=out, threads=count)
+            results[count] = frames/(time.perf_counter() - start)
+
+        return results
+
+# ---------------------------------------------------------------------------- #
+
+class __pytest__:
+    def test_yuv_primaries(self):
+        for (color, expect) in (
+            ((  0,   0,   0), ( 16, 128, 128)),
+            ((255, 255, 255), (235, 128, 128)),
+            ((255,   0,   0), ( 63, 102, 240)),
+            ((  0,   0, 255), ( 32, 240, 118)),
+        ):
+            rgb = np.full((4, 6, 3), color, dtype=np.uint8)
+            yuv = Vectron.rgb_to_yuv(rgb, matrix="bt709")
+            assert yuv.size == (4*6 + 2*3*2)
+            assert np.abs(yuv[[0, 24, 30]].astype(int) - expect).max() <= 1
+
+    def test_yuv_layouts(self):
+        rgb = np.random.randint(0, 256, (37, 51, 3), dtype=np.uint8)
+        planar = Vectron.rgb_to_yuv(rgb, format="yuv420p")
+        interleaved = Vectron.rgb_to_yuv(rgb, format="nv12", threads=4)
+        (luma, chroma) = (37*51, 19*26)
+        assert np.array_equal(planar[:luma], interleaved[:luma])
+        assert np.array_equal(planar[luma:luma+chroma], interleaved[luma::2])
+        assert np.array_equal(planar[luma+chroma:], interleaved[luma+1::2])
+
+    def test_yuv_against_ffmpeg(self):
+        import shutil
+        import subprocess
+
+        import pytest
+        if not shutil.which("ffmpeg"):
+            pytest.skip("FFmpeg isn't available")
+
+        # Smooth gradients, as chroma siting differs on sharp edges
+        (width, height) = (320, 180)
+        (x, y) = np.meshgrid(np.linspace(0, 1, width), np.linspace(0, 1, height))
+        rgb = (np.stack((x, y, 1 - x*y), axis=-1)*255).astype(np.uint8)
+
+        for matrix in Vectron.Matrix:
+            reference = np.frombuffer(subprocess.run((
+                "ffmpeg", "-loglevel", "error",
+                "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-i", "-",
+                "-vf", f"scale=out_color_matrix={matrix.value}:out_range=tv",
+                "-pix_fmt", "yuv420p", "-f", "rawvideo", "-"
+            ), input=rgb.tobytes(), capture_output=True, check=True).stdout, dtype=np.uint8)
+            ours = Vectron.rgb_to_yuv(rgb, matrix=matrix)
+            error = np.abs(ours.astype(int) - reference)
+            assert error.max() <= 3
+            assert error.mean() <= 1
+
+    def test_yuv_roundtrip(self):
+        import shutil
+        import subprocess
+
+        import pytest
+        if not shutil.which("ffmpeg"):
+            pytest.skip("FFmpeg isn't available")
+
+        # FFmpeg decoding our frames must give back the source image
+        (width, height) = (320, 180)
+        (x, y) = np.meshgrid(np.linspace(0, 1, width), np.linspace(0, 1, height))
+        rgb = (np.stack((x, y, 1 - x*y), axis=-1)*255).astype(np.uint8)
+
+        for matrix in Vectron.Matrix:
+            decoded = np.frombuffer(subprocess.run((
+                "ffmpeg", "-loglevel", "error",
+                "-f", "rawvideo", "-pix_fmt", "yuv420p", "-s", f"{width}x{height}", "-i", "-",
+                "-vf", f"scale=in_color_matrix={matrix.value}:in_range=tv",
+                "-pix_fmt", "rgb24", "-f", "rawvideo", "-"
+            ), input=Vectron.rgb_to_yuv(rgb, matrix=matrix).tobytes(),
+                capture_output=True, check=True).stdout, dtype=np.uint8)
+            error = np.abs(decoded.reshape(rgb.shape).astype(int) - rgb)
+            assert error.max() <= 6
+            assert error.mean() <= 1.5
+
+    def test_yuv_benchmark(self):
+        results = Vectron.yuv_benchmark(width=64, height=36, frames=3, threads=(1, 2))
+        assert list(results) == [1, 2]
+        assert all(fps > 0 for fps in results.values())